@@ -0,0 +1,174 @@
+# Benchmark suite for the converter, results are written as JSON to compare runs
+#   python benchmarks/run_benchmarks.py --files 2000 --image-data 200000 --output results.json
+#   python benchmarks/run_benchmarks.py --dataset /data/annotations --workers 8
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import multiprocessing
+
+try:
+    import resource  # Not available on Windows, peak RSS is then reported as null
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from synthetic import generate_dataset, add_dataset_arguments  # noqa: E402
+from converter import JSONToTXTConverter, ConversionSummary  # noqa: E402
+
+STAGES = ("extract_labels", "convert_files")
+
+
+def _peak_rss_mb():
+    # Peak resident memory of this process and its finished children
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB elsewhere
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak / scale, 1)
+
+
+class BenchmarkConverter(JSONToTXTConverter):
+    # Writes the YOLO txt files below output_dir instead of next to the annotations,
+    # so benchmarking a real dataset never overwrites files in it
+
+    def __init__(self, input_files, selected_labels, output_dir=None, dataset_root=None, **kwargs):
+        super().__init__(input_files, selected_labels, **kwargs)
+        self.output_dir = output_dir
+        self.dataset_root = dataset_root
+
+    def _output_path(self, file_path):
+        relative = os.path.relpath(os.path.abspath(file_path), self.dataset_root)
+        output_file = os.path.join(self.output_dir, os.path.splitext(relative)[0] + ".txt")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        return output_file
+
+    def _worker_options(self):
+        options = super()._worker_options()
+        options.update(output_dir=self.output_dir, dataset_root=self.dataset_root)
+        return options
+
+
+def _run_stage(stage, files, labels, workers, output_dir, dataset_root, results_queue):
+    # Runs in a fresh process so each stage gets its own peak RSS
+    logging.disable(logging.CRITICAL)
+    converter = BenchmarkConverter(files, labels, output_dir, dataset_root, workers=workers)
+    start = time.perf_counter()
+    if stage == "extract_labels":
+        _, file_label_map = converter.extract_labels()
+        failed = len(files) - len(file_label_map)
+    else:
+        failed = ConversionSummary().consume(converter.iter_results()).failed
+    results_queue.put({"seconds": time.perf_counter() - start, "failed": failed, "peak_rss_mb": _peak_rss_mb()})
+
+
+def run_stage(stage, files, labels, workers, output_dir, dataset_root):
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    process = context.Process(
+        target=_run_stage, args=(stage, files, labels, workers, output_dir, dataset_root, results_queue)
+    )
+    process.start()
+    result = results_queue.get()
+    process.join()
+    return result
+
+
+def _count_shapes(files, labels):
+    selected = set(labels)
+    total = 0
+    for file_path in files:
+        with open(file_path, 'r') as f:
+            total += sum(1 for shape in json.load(f).get("shapes", []) if shape.get("label") in selected)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark label extraction and conversion.")
+    parser.add_argument("--dataset", help="Benchmark an existing folder of JSON files instead of generating one")
+    add_dataset_arguments(parser)
+    parser.add_argument("--workers", type=int, default=1, help="Converter worker processes (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, the fastest is reported (default: 3)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Generated datasets and every conversion output live in the work dir, which is removed afterwards
+    work_dir = tempfile.mkdtemp(prefix="any2yolo-bench-")
+    output_dir = os.path.join(work_dir, "output")
+    try:
+        if args.dataset:
+            dataset_root = os.path.abspath(args.dataset)
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(args.dataset) for name in names if name.endswith(".json")
+            )
+            labels, _ = JSONToTXTConverter(files, []).extract_labels()
+        else:
+            dataset_root = os.path.join(work_dir, "dataset")
+            files, labels = generate_dataset(
+                dataset_root, args.files, args.polygons, args.points, args.labels, args.image_data, args.seed
+            )
+        shapes = _count_shapes(files, labels)
+        input_bytes = sum(os.path.getsize(file_path) for file_path in files)
+        stages = {}
+        for stage in STAGES:
+            runs = [
+                run_stage(stage, files, labels, args.workers, output_dir, dataset_root)
+                for _ in range(max(1, args.repeat))
+            ]
+            best = min(runs, key=lambda run: run["seconds"])
+            seconds = max(best["seconds"], 1e-9)
+            stages[stage] = {
+                "seconds": round(seconds, 6),
+                "all_seconds": [round(run["seconds"], 6) for run in runs],
+                "files_per_sec": round(len(files) / seconds, 1),
+                "shapes_per_sec": round(shapes / seconds, 1),
+                "mb_per_sec": round(input_bytes / seconds / 1e6, 2),
+                "peak_rss_mb": best["peak_rss_mb"],
+                "failed_files": best["failed"],
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "dataset": args.dataset,
+            "files": len(files),
+            "polygons": None if args.dataset else args.polygons,
+            "points": None if args.dataset else args.points,
+            "labels": len(labels),
+            "image_data_bytes": None if args.dataset else args.image_data,
+            "seed": None if args.dataset else args.seed,
+            "workers": args.workers,
+            "repeat": args.repeat,
+        },
+        "totals": {"files": len(files), "shapes": shapes, "input_bytes": input_bytes},
+        "stages": stages,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark report to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Deterministic generator of synthetic AnyLabeling JSON datasets for benchmarks
+#   python benchmarks/synthetic.py /tmp/dataset --files 1000 --polygons 20 --points 30
+import os
+import json
+import math
+import base64
+import random
+import argparse
+from functools import lru_cache
+
+IMAGE_WIDTH = 1920
+IMAGE_HEIGHT = 1080
+
+
+@lru_cache(maxsize=None)
+def _unit_circle(points):
+    return [(math.cos(2 * math.pi * i / points), math.sin(2 * math.pi * i / points)) for i in range(points)]
+
+
+def _polygon(rng, points):
+    # A random star-shaped polygon inside the image
+    cx = rng.uniform(0.1, 0.9) * IMAGE_WIDTH
+    cy = rng.uniform(0.1, 0.9) * IMAGE_HEIGHT
+    radius = rng.uniform(5, 150)
+    polygon = []
+    for cos, sin in _unit_circle(points):
+        scale = radius * rng.uniform(0.5, 1.0)
+        polygon.append([
+            round(min(max(cx + scale * cos, 0), IMAGE_WIDTH), 2),
+            round(min(max(cy + scale * sin, 0), IMAGE_HEIGHT), 2),
+        ])
+    return polygon
+
+
+def generate_dataset(output_dir, files=1000, polygons=20, points=30, labels=10, image_data_bytes=0, seed=0):
+    # Write `files` JSON files and return their paths, the same arguments always give the same bytes
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    label_names = [f"class_{i}" for i in range(labels)]
+    image_data = base64.b64encode(random.Random(seed).randbytes(image_data_bytes)).decode() if image_data_bytes else None
+    paths = []
+
+    for index in range(files):
+        shapes = [
+            {
+                "label": rng.choice(label_names),
+                "points": _polygon(rng, points),
+                "group_id": None,
+                "shape_type": "polygon",
+                "flags": {},
+            }
+            for _ in range(polygons)
+        ]
+        document = {
+            "version": "0.3.3",
+            "flags": {},
+            "shapes": shapes,
+            "imagePath": f"image_{index:07d}.jpg",
+            "imageData": image_data,
+            "imageHeight": IMAGE_HEIGHT,
+            "imageWidth": IMAGE_WIDTH,
+        }
+        path = os.path.join(output_dir, f"image_{index:07d}.json")
+        with open(path, 'w') as f:
+            json.dump(document, f)
+        paths.append(path)
+
+    return paths, label_names
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--files", type=int, default=1000, help="Number of JSON files (default: 1000)")
+    parser.add_argument("--polygons", type=int, default=20, help="Polygons per file (default: 20)")
+    parser.add_argument("--points", type=int, default=30, help="Points per polygon (default: 30)")
+    parser.add_argument("--labels", type=int, default=10, help="Number of distinct labels (default: 10)")
+    parser.add_argument("--image-data", type=int, default=0, help="Raw bytes of embedded imageData (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic AnyLabeling dataset.")
+    parser.add_argument("output_dir")
+    add_dataset_arguments(parser)
+    args = parser.parse_args(argv)
+    paths, _ = generate_dataset(
+        args.output_dir, args.files, args.polygons, args.points, args.labels, args.image_data, args.seed
+    )
+    print(f"Wrote {len(paths)} files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
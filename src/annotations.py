@@ -0,0 +1,85 @@
+# Parsed annotation summaries shared by label extraction and conversion
+
+# A summary keeps only the fields the converter reads from an AnyLabeling JSON,
+# so the (often huge) base64 imageData never stays in memory
+import os
+import logging
+from collections import OrderedDict
+from jsonreader import read_annotation
+
+logger = logging.getLogger("Any2YOLO.annotations")
+
+SUMMARY_KEYS = ("shapes", "imageWidth", "imageHeight", "imagePath")
+
+
+def summarize(data):
+    # Reduce a parsed JSON document to the keys used downstream
+    return {key: data[key] for key in SUMMARY_KEYS if key in data}
+
+
+def load_annotation(file_path, stats=None):
+    # Parse a JSON file into its summary, skipping the embedded imageData
+    return summarize(read_annotation(file_path, stats=stats))
+
+
+def _points_in(summary):
+    # Rough memory cost of a summary, counted in polygon points
+    return sum(len(shape.get('points', ())) for shape in summary.get('shapes', [])) + 1
+
+
+class AnnotationCache:
+    # LRU cache of annotation summaries keyed by path, mtime and size
+
+    def __init__(self, max_entries=50000, max_points=20_000_000):
+        self.max_entries = max_entries
+        self.max_points = max_points  # Bounds memory by the number of cached polygon points
+        self._entries = OrderedDict()  # path -> ((mtime_ns, size), summary, points)
+        self._points = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, file_path):
+        return file_path in self._entries
+
+    def get(self, file_path, stats=None, load=load_annotation):
+        # Return the summary for a file, parsing it with load(file_path, stats) only if new or changed on disk
+        stat = os.stat(file_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(file_path)
+        if entry is not None and entry[0] == key:
+            self._entries.move_to_end(file_path)
+            self.hits += 1
+            if stats is not None:
+                stats.cache_hits += 1
+            return entry[1]
+
+        self.misses += 1
+        summary = load(file_path, stats)
+        self._store(file_path, key, summary)
+        return summary
+
+    def discard(self, file_path):
+        # Drop a single file from the cache
+        entry = self._entries.pop(file_path, None)
+        if entry is not None:
+            self._points -= entry[2]
+
+    def clear(self):
+        self._entries.clear()
+        self._points = 0
+
+    def _store(self, file_path, key, summary):
+        self.discard(file_path)
+        points = _points_in(summary)
+        if points > self.max_points:
+            logger.debug("Not caching %s: %s points exceed the cache budget", file_path, points)
+            return
+
+        self._entries[file_path] = (key, summary, points)
+        self._points += points
+        while len(self._entries) > self.max_entries or self._points > self.max_points:
+            _, (_, _, evicted_points) = self._entries.popitem(last=False)
+            self._points -= evicted_points
@@ -0,0 +1,386 @@
+# Headless command line entry point for Any2YOLO
+
+# Runs the JSON to YOLO conversion without tkinter or Pillow, e.g. on build servers:
+#   python src/cli.py annotations/ "more/**/*.json" --labels dog cat --workers 8
+#   python src/cli.py annotations/ --labels dog cat --export-dir dataset/ --split 0.8 0.1 0.1
+#   python src/cli.py annotations/ --index labels.sqlite --labels dog --only-labeled
+#   python src/cli.py annotations/ --labels dog cat --shard 0/4 --shard-dir shards/
+#   python src/cli.py aerial/ --labels plane ship --export-dir tiles/ --tile-size 640 --crop-tiles
+#   python src/cli.py /mnt/nfs/annotations/ --labels dog cat --read-ahead 32
+#   python src/cli.py instances_train.json --format coco --image-dir images/train/ --labels person car
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from converter import JSONToTXTConverter, ConversionSummary, OUTPUT_MODES, DEFAULT_READ_THREADS
+from export import DatasetExporter, DEFAULT_SPLITS, LINK_MODES
+from tiling import TilingExporter, DEFAULT_OVERLAP, DEFAULT_MIN_AREA_RATIO
+from manifest import ConversionManifest
+from labelindex import LabelIndex
+from instrumentation import RunStats
+from sharding import parse_shard, select_shard, write_shard_result, merge_shards
+from readers import READERS, COCOReader
+
+logger = logging.getLogger("Any2YOLO.cli")
+
+
+def _scan_directory(directory, extensions=(".json",)):
+    # Recursively yield annotation files, one directory listing at a time
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning("Cannot scan directory %s: %s", current, e)
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                yield entry.path
+        stack.extend(reversed(subdirectories))
+
+
+def _expand(source, extensions):
+    # Files for a single command line argument: a directory, a glob pattern or a file
+    if os.path.isdir(source):
+        yield from _scan_directory(source, extensions)
+    elif glob.has_magic(source):
+        for match in glob.iglob(source, recursive=True):
+            if os.path.isdir(match):
+                yield from _scan_directory(match, extensions)
+            elif match.lower().endswith(extensions):
+                yield match
+    else:
+        yield source
+
+
+def discover_files(sources, extensions=(".json",)):
+    # Stream annotation files from every source, dropping duplicates when sources may overlap
+    seen = set() if len(sources) > 1 else None
+    for source in sources:
+        for file_path in _expand(source, extensions):
+            if seen is not None:
+                key = os.path.abspath(file_path)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield file_path
+
+
+def _source_root(sources):
+    # Folder shared by every source argument, independent of which files a shard gets
+    folders = []
+    for source in sources:
+        if glob.has_magic(source):
+            source = source[:min(source.find(char) for char in "*?[" if char in source)]
+            folders.append(source if source.endswith(("/", os.sep)) else os.path.dirname(source))
+        else:
+            folders.append(source if os.path.isdir(source) else os.path.dirname(source))
+    return os.path.commonpath([os.path.abspath(folder or ".") for folder in folders])
+
+
+def _tolerance(value):
+    # (tolerance, relative) from "1.5" pixels or "0.1%" of the image diagonal
+    relative = value.endswith("%")
+    try:
+        tolerance = float(value[:-1] if relative else value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid tolerance: {value}")
+    if tolerance < 0:
+        raise argparse.ArgumentTypeError(f"tolerance must not be negative: {value}")
+    return (tolerance / 100, True) if relative else (tolerance, False)
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog="any2yolo",
+        description="Convert AnyLabeling, LabelMe, Pascal VOC or COCO annotations into YOLO txt files.",
+    )
+    parser.add_argument(
+        "sources", nargs="*", help="Annotation files, directories (scanned recursively) or glob patterns"
+    )
+    parser.add_argument("-l", "--labels", nargs="+", help="Labels to export, in class order (default: all labels found)")
+    parser.add_argument(
+        "-f", "--format", choices=["auto", *READERS], default="auto",
+        help="Input format, auto picks it by extension: .json AnyLabeling, .xml Pascal VOC (default: auto)",
+    )
+    parser.add_argument(
+        "--image-dir", help="COCO only: folder the image file names are relative to (default: the JSON's folder)"
+    )
+    parser.add_argument(
+        "-m", "--mode", choices=list(OUTPUT_MODES), default="detect",
+        help="detect writes a box per polygon, segment the whole polygon for YOLO -seg models, "
+             "obb its minimum-area rotated rectangle for YOLO-OBB models (default: detect)",
+    )
+    parser.add_argument(
+        "--simplify", type=_tolerance, default=(0.0, False), metavar="TOLERANCE",
+        help="Segment mode: drop polygon vertices closer than TOLERANCE pixels to the simplified outline, "
+             "or a percentage of the image diagonal with a %% suffix (e.g. 0.1%%)",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Worker processes, 0 uses every core (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Files per worker task (default: automatic)")
+    parser.add_argument(
+        "--read-ahead", type=int, default=0, metavar="N",
+        help="Read up to N files ahead of the conversion and write outputs on a separate thread, "
+             "hides the latency of network storage (default: 0, off)",
+    )
+    parser.add_argument(
+        "--read-threads", type=int, default=DEFAULT_READ_THREADS, metavar="N",
+        help=f"Threads reading ahead with --read-ahead (default: {DEFAULT_READ_THREADS})",
+    )
+    parser.add_argument("--manifest", help="Manifest file for incremental conversion")
+    parser.add_argument(
+        "--check-image-size", action="store_true",
+        help="Warn about files whose imageWidth/imageHeight disagree with the image header",
+    )
+    parser.add_argument(
+        "--no-validate", action="store_true", help="Write boxes as computed, without clipping or dropping polygons"
+    )
+    parser.add_argument("--min-box-size", type=float, default=0.0, help="Drop boxes narrower or lower than this, in pixels")
+    parser.add_argument("--issues", help="Write repaired and dropped polygons here, one JSON object per line")
+    parser.add_argument(
+        "--dedup", help="Dedup database, files with an already converted payload reuse its output (kept between runs)"
+    )
+    parser.add_argument("--index", help="Label index database, files are only parsed again when they changed")
+    parser.add_argument(
+        "--only-labeled", action="store_true", help="Only convert files containing at least one selected label"
+    )
+    parser.add_argument("--list-labels", action="store_true", help="Print files and shapes per label, then exit")
+    parser.add_argument("--report", help="Write a JSON timing and throughput report here")
+    parser.add_argument("--prometheus", help="Write the report in Prometheus text format here")
+    export = parser.add_argument_group("dataset export")
+    export.add_argument("--export-dir", help="Build a YOLO dataset (images/, labels/, data.yaml) here instead of writing txt files next to the JSON")
+    export.add_argument(
+        "--split", type=float, nargs="+", default=list(DEFAULT_SPLITS), metavar="RATIO",
+        help="train/val/test ratios (default: 0.8 0.2 0)",
+    )
+    export.add_argument("--link", choices=list(LINK_MODES), default="hardlink", help="How images are placed (default: hardlink)")
+    export.add_argument("--seed", type=int, default=0, help="Seed of the train/val/test assignment (default: 0)")
+    export.add_argument(
+        "--source-root", help="Folder the dataset names and splits are relative to (default: the folder shared by the sources)"
+    )
+    export.add_argument("--prune", action="store_true", help="Delete stale outputs of earlier exports instead of listing them")
+    tiling = parser.add_argument_group("tiling (with --export-dir)")
+    tiling.add_argument("--tile-size", type=int, help="Cut images into tiles of this many pixels, labels are clipped per tile")
+    tiling.add_argument(
+        "--tile-overlap", type=int, default=DEFAULT_OVERLAP, help=f"Pixels shared by neighbouring tiles (default: {DEFAULT_OVERLAP})"
+    )
+    tiling.add_argument(
+        "--min-tile-area", type=float, default=DEFAULT_MIN_AREA_RATIO, metavar="RATIO",
+        help=f"Drop an object from a tile holding less than this part of its area (default: {DEFAULT_MIN_AREA_RATIO})",
+    )
+    tiling.add_argument("--crop-tiles", action="store_true", help="Also save every tile's image crop (needs Pillow)")
+    tiling.add_argument("--keep-empty-tiles", action="store_true", help="Also write tiles without objects")
+    sharding = parser.add_argument_group("sharding")
+    sharding.add_argument("--shard", help="Only convert shard INDEX of COUNT (e.g. 0/4), every node passes the same sources")
+    sharding.add_argument("--shard-dir", default=".", help="Where the shard result file is written (default: .)")
+    sharding.add_argument(
+        "--merge-shards", metavar="DIR",
+        help="Combine the shard results in DIR into one report, sources are checked for files no shard converted",
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="Log every processed file")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="Only log errors")
+    return parser
+
+
+def _input_format(args):
+    # Reader name, or a configured reader for options only some formats have
+    if args.format == "coco" and args.image_dir:
+        return COCOReader(image_dir=args.image_dir)
+    return args.format
+
+
+def _extensions(args):
+    # Directories are scanned for the files of the chosen format, with auto for every extension it recognizes
+    if args.format == "auto":
+        return tuple(dict.fromkeys(extension for reader in READERS.values() for extension in reader.auto_extensions))
+    return READERS[args.format].extensions
+
+
+def _merge(args):
+    # Report on the shard results of a distributed run
+    expected_files = list(discover_files(args.sources, _extensions(args))) if args.sources else None
+    try:
+        report = merge_shards(args.merge_shards, expected_files)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    for file_path, result in report["errors"].items():
+        print(f"{file_path}: {result}", file=sys.stderr)
+    for problem in report["problems"]:
+        print(problem, file=sys.stderr)
+    for key in ("missing_shards", "missing_files", "duplicate_files", "misplaced_files"):
+        if report[key]:
+            print(f"{key.replace('_', ' ').capitalize()}: {len(report[key])}", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(
+        f"{report['shards_found']} of {report['shard_count']} shards: converted {report['converted']}, "
+        f"up to date {report['up_to_date']}, failed {report['failed']}"
+        + ("" if report["complete"] else ", INCOMPLETE")
+    )
+    return 0 if report["complete"] and not report["failed"] else 1
+
+
+def main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    level = logging.INFO if args.verbose else logging.ERROR if args.quiet else logging.WARNING
+    logging.basicConfig(level=level, format="%(asctime)s - [%(levelname)s] - %(message)s")
+
+    if args.merge_shards:
+        return _merge(args)
+    if not args.sources:
+        parser.error("the following arguments are required: sources")
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        if not args.labels:
+            # Each shard would otherwise pick class ids from its own files only
+            parser.error("--shard needs --labels, so every shard uses the same class ids")
+    if args.tile_size and not args.export_dir:
+        parser.error("--tile-size needs --export-dir")
+    if args.prune and (shard or not args.export_dir):
+        parser.error("--prune needs --export-dir and cannot be combined with --shard")
+    if args.tile_size and (args.manifest or args.dedup):
+        parser.error("--tile-size cannot be combined with --manifest or --dedup")
+    if args.simplify[0] and args.mode != "segment":
+        parser.error("--simplify only applies to --mode segment")
+    if args.read_ahead < 0 or args.read_threads < 1:
+        parser.error("--read-ahead must be 0 or more and --read-threads at least 1")
+    multi_record = args.format != "auto" and READERS[args.format].multi_record
+    if multi_record and args.only_labeled:
+        parser.error(f"--only-labeled selects files, it does not apply to {args.format} input")
+
+    start = time.perf_counter()
+    # Shard results always carry stats, for the merged report, simplification reports its vertex counts
+    stats = RunStats() if args.report or args.prometheus or shard or args.simplify[0] else None
+    input_format = _input_format(args)
+    input_files = discover_files(args.sources, _extensions(args))
+    if shard:
+        input_files = select_shard(input_files, *shard)
+    selected_labels = args.labels
+    labels_found = None
+    if args.index or args.only_labeled or args.list_labels:
+        # Label queries need every file indexed first, so the file list is materialized
+        index = LabelIndex(args.index or ":memory:")
+        input_files = list(input_files)
+        labels_found, file_label_map = JSONToTXTConverter(
+            input_files, [], stats=stats, index=index, input_format=input_format
+        ).extract_labels()
+        if args.list_labels:
+            if multi_record:
+                # Images of multi-image files are not in the index, only their labels are known
+                for label in labels_found:
+                    images = sum(label in labels for labels in file_label_map.values())
+                    print(f"{label}\t{images} images")
+                return 0
+            for label, (files, shapes) in index.label_counts(input_files).items():
+                print(f"{label}\t{files} files\t{shapes} shapes")
+            return 0
+        if args.only_labeled:
+            wanted = set(selected_labels or labels_found)
+            kept = [f for f in input_files if wanted.intersection(file_label_map.get(f, ()))]
+            print(f"Converting {len(kept)} of {len(input_files)} files containing the selected labels")
+            input_files = kept
+    if not selected_labels:
+        if labels_found is None:
+            # Every label needs a full pass first, so the file list is materialized
+            input_files = list(input_files)
+            labels_found, _ = JSONToTXTConverter(
+                input_files, [], stats=stats, input_format=input_format
+            ).extract_labels()
+        selected_labels = labels_found
+        print(f"Using all {len(selected_labels)} labels: {', '.join(selected_labels)}")
+        if not selected_labels:
+            print("No labels found in the given files.", file=sys.stderr)
+            return 1
+
+    manifest = ConversionManifest(args.manifest) if args.manifest else None
+    summary = ConversionSummary()
+    issues_file = None
+
+    def on_issue(issue):
+        # Validation issues are counted and streamed to --issues as they are found, never collected
+        summary.add_issue(issue)
+        if issues_file is not None:
+            issues_file.write(json.dumps(issue) + "\n")
+
+    options = {
+        "workers": args.workers, "chunk_size": args.chunk_size, "manifest": manifest, "stats": stats,
+        "check_image_size": args.check_image_size, "validate": not args.no_validate, "min_box_size": args.min_box_size,
+        "dedup": args.dedup, "input_format": input_format, "read_ahead": args.read_ahead, "read_threads": args.read_threads,
+        "output_mode": args.mode, "simplify": args.simplify[0], "simplify_relative": args.simplify[1],
+        "on_issue": on_issue,
+    }
+    if args.export_dir:
+        # Names and splits are relative to the source root, not to the files found, so they do not change with
+        # the input set. A shard only sees its own files, stale outputs are left to a full export
+        if args.tile_size:
+            options.update(
+                tile_size=args.tile_size, overlap=args.tile_overlap, min_area_ratio=args.min_tile_area,
+                crop_images=args.crop_tiles, keep_empty=args.keep_empty_tiles,
+            )
+        exporter_class = TilingExporter if args.tile_size else DatasetExporter
+        try:
+            converter = exporter_class(
+                input_files, selected_labels, args.export_dir,
+                splits=args.split, seed=args.seed, link_mode=args.link,
+                source_root=os.path.abspath(args.source_root) if args.source_root else _source_root(args.sources),
+                find_stale=not shard, remove_stale=args.prune, **options
+            )
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    else:
+        converter = JSONToTXTConverter(input_files, selected_labels, **options)
+    # Results are streamed, only a shard keeps them all for its result file
+    shard_results = {} if shard else None
+    issues_file = open(args.issues, 'w') if args.issues else None
+    try:
+        for file_path, result in converter.iter_results():
+            summary.add(file_path, result)
+            if result.startswith("Error"):
+                print(f"{file_path}: {result}", file=sys.stderr)
+            if shard_results is not None:
+                shard_results[file_path] = result
+    finally:
+        if issues_file is not None:
+            issues_file.close()
+    for output_file in converter.stale_outputs:
+        print(f"{'Removed stale' if args.prune else 'Stale'} output: {output_file}", file=sys.stderr)
+
+    if shard:
+        write_shard_result(args.shard_dir, *shard, selected_labels, shard_results, stats)
+    if args.report:
+        stats.write_json(args.report)
+    if args.prometheus:
+        stats.write_prometheus(args.prometheus)
+
+    elapsed = time.perf_counter() - start
+    print(f"Converted {summary.converted}, up to date {summary.up_to_date}, failed {summary.failed} in {elapsed:.2f}s")
+    if summary.issue_counts:
+        print(summary.issues_message())
+    if stats is not None and stats.vertices_before_simplify:
+        before, after = stats.vertices_before_simplify, stats.vertices_after_simplify
+        print(f"Simplified polygons from {before} to {after} vertices ({100 * (1 - after / before):.1f}% fewer)")
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
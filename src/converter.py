@@ -4,104 +4,760 @@
 # - JSON files contain "shapes" with polygon data
 # - Only user-selected labels are processed and included in the output
 # - Bounding box calculations are scaled to image dimensions (width and height)
+# Output modes: "detect" writes one box per polygon (class x_center y_center w h),
+# "segment" the whole normalized polygon (class x1 y1 x2 y2 ...) for YOLO -seg models,
+# optionally simplified (Douglas-Peucker) to shrink dense masks, "obb" the 4 corners of the
+# polygon's minimum-area rotated rectangle (class x1 y1 ... x4 y4) for YOLO-OBB models
 import os
-import json
+import time
 import logging
+import threading
+from collections import deque, Counter
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from annotations import load_annotation
+from geometry import (
+    pack_polygons, polygon_offsets, bounding_boxes, normalize_points, validate_polygons, simplify_polygons,
+    min_area_rectangles,
+)
+from manifest import ConversionManifest
+from instrumentation import RunStats
+from imagesize import ImageSizeCache, find_image
+from dedup import DedupIndex, payload_key
+from readers import get_reader
+
+logger = logging.getLogger("Any2YOLO.converter")
+
+# Upper bound for automatically sized task batches sent to worker processes
+MAX_CHUNK_SIZE = 256
+# Batch size used when the number of input files is not known up front
+STREAM_CHUNK_SIZE = 64
+# Reader threads of the pipelined mode
+DEFAULT_READ_THREADS = 4
+# Validation issues a converter keeps in memory, all of them go to its on_issue callback
+ISSUE_SAMPLE_SIZE = 100
+OUTPUT_MODES = ("detect", "segment", "obb")
+# Polygon and OBB coordinates are written with 6 decimals (Ultralytics' precision), formatting full
+# float reprs was the slowest part of writing dense masks
+POLYGON_COORDINATE = " %.6f"
+
+
+def _init_worker():
+    # Forked workers inherit the GUI's queue handler, but its listener thread only runs
+    # in the parent, so records would pile up unseen. Let them reach the root logger instead
+    app_logger = logging.getLogger("Any2YOLO")
+    for handler in list(app_logger.handlers):
+        app_logger.removeHandler(handler)
+    app_logger.propagate = True
+
+
+def _convert_chunk(converter_class, options, file_paths, manifest_entries=None, collect_stats=False):
+    # Runs inside a worker process: converts one batch of files serially
+    # Returns the results, the validation issues and, when enabled, the batch's updated manifest entries and stats
+    manifest = ConversionManifest(entries=manifest_entries) if manifest_entries is not None else None
+    stats = RunStats() if collect_stats else None
+    issues = []  # Bounded by the batch, the parent passes them on and drops them
+    converter = converter_class(file_paths, manifest=manifest, stats=stats, on_issue=issues.append, **options)
+    results = converter._convert_serial(file_paths)
+    if converter.dedup is not None:
+        converter.dedup.flush()
+    return (
+        results,
+        issues,
+        manifest.entries if manifest is not None else None,
+        stats.to_dict() if stats is not None else None,
+    )
+
+
+class ConversionSummary:
+    # Counters of a conversion fed with (file_path, result) pairs, keeps only a bounded sample of errors
+
+    def __init__(self, max_errors=20):
+        self.converted = 0
+        self.up_to_date = 0
+        self.failed = 0
+        self.max_errors = max_errors
+        self.errors = []  # First max_errors (file_path, result) pairs of failed files
+        self.issue_counts = Counter()  # Validation issue name -> polygons
+
+    @property
+    def total(self):
+        return self.converted + self.up_to_date + self.failed
+
+    def add(self, file_path, result):
+        if result.startswith("Error"):
+            self.failed += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append((file_path, result))
+        elif result.startswith("Up to date"):
+            self.up_to_date += 1
+        else:
+            self.converted += 1
+
+    def consume(self, results):
+        # Add every pair of an iterable, e.g. JSONToTXTConverter.iter_results()
+        for file_path, result in results:
+            self.add(file_path, result)
+        return self
+
+    def add_issue(self, issue):
+        # Count a validation issue, usable as JSONToTXTConverter's on_issue callback
+        self.issue_counts.update(issue["issues"])
+
+    def issues_message(self):
+        counts = ", ".join(f"{name} {count}" for name, count in sorted(self.issue_counts.items()))
+        return f"Polygons repaired or dropped: {counts}"
+
+    def message(self):
+        lines = [f"Converted {self.converted}, up to date {self.up_to_date}, failed {self.failed}"]
+        if self.issue_counts:
+            lines.append(self.issues_message())
+        lines += [f"{file_path}: {result}" for file_path, result in self.errors]
+        if self.failed > len(self.errors):
+            lines.append(f"... and {self.failed - len(self.errors)} more errors, see the log")
+        return "\n".join(lines)
+
 
 class JSONToTXTConverter:
     # Handles JSON to YOLO txt
 
-    def __init__(self, input_files, selected_labels):
-        self.input_files = input_files if isinstance(input_files, list) else [input_files]
+    def __init__(
+        self, input_files, selected_labels, workers=1, chunk_size=None, cache=None, manifest=None, stats=None,
+        index=None, check_image_size=False, validate=True, min_box_size=0.0, dedup=None,
+        input_format="auto", output_mode="detect", simplify=0.0, simplify_relative=False,
+        read_ahead=0, read_threads=DEFAULT_READ_THREADS, on_issue=None
+    ):
+        # A list of paths, or any iterable (e.g. a directory scan) consumed once by convert_files
+        self.input_files = [input_files] if isinstance(input_files, str) else input_files
         self.selected_labels = selected_labels
-        logging.info(f"Initialized converter with files: {self.input_files} and selected labels: {self.selected_labels}")
+        # Label -> class id lookup, the first occurrence wins like list.index
+        self.class_ids = {}
+        for class_id, label in enumerate(selected_labels):
+            self.class_ids.setdefault(label, class_id)
+        self.cache = cache  # Optional AnnotationCache, reused across extraction and conversion
+        self.manifest = manifest  # Optional ConversionManifest, enables incremental conversion
+        self.stale_outputs = []  # Outputs left behind by deleted inputs, filled in incremental mode
+        self.stats = stats  # Optional RunStats collecting per-stage timings
+        self.index = index  # Optional LabelIndex, label extraction only parses new or changed files
+        # Compare imageWidth/imageHeight with the image header, missing ones are always read from the image
+        self.check_image_size = check_image_size
+        self.image_sizes = ImageSizeCache()
+        # Clip polygons to the image and drop broken or tiny ones (boxes under min_box_size pixels)
+        self.validate = validate
+        self.min_box_size = min_box_size
+        # Optional callable receiving a dict per repaired or dropped polygon as it is found (see _add_issues),
+        # e.g. to stream them to a file. Only the first ISSUE_SAMPLE_SIZE are kept in self.issues
+        self.on_issue = on_issue
+        self.issues = []
+        # Optional DedupIndex (or its path), files with an already converted payload reuse its output
+        self.dedup = DedupIndex(dedup) if isinstance(dedup, str) else dedup
+        # Reader name (anylabeling, labelme, voc, coco), an AnnotationReader, or "auto" to go by extension
+        self.input_format = input_format
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode {output_mode}, expected one of {', '.join(OUTPUT_MODES)}")
+        self.output_mode = output_mode
+        # Simplification tolerance of segment polygons, in pixels or, when relative, as a fraction of the image diagonal
+        self.simplify = simplify
+        self.simplify_relative = simplify_relative
+        self.workers = workers or os.cpu_count() or 1  # 0/None uses every core
+        self.chunk_size = chunk_size  # Files per worker task, None sizes it automatically
+        # Pipelined mode for high latency storage: read_threads threads load up to read_ahead files ahead
+        # of the computation, outputs are written on another thread. 0 converts strictly file by file
+        self.read_ahead = read_ahead
+        self.read_threads = max(1, min(read_threads, read_ahead or 1))
+        self._thread_stats = threading.local()  # Stats _timer uses on the writer thread, merged afterwards
+        logger.info("Initialized converter with selected labels: %s", self.selected_labels)
+        logger.debug("Input files: %s", self.input_files)
 
-    def extract_labels(self):
+    def extract_labels(self, progress=None, cancel=None):
         # Extract unique labels and map to respective files
-        logging.info("Starting label extraction...")
+        # progress(done, total) and the cancel event work like in convert_files
+        logger.info("Starting label extraction...")
+        start = time.perf_counter()
+        file_paths = self.input_files
+        if self.index is not None:
+            file_paths = list(file_paths)
+            if not any(self._is_multi_record(file_path) for file_path in file_paths):
+                return self._extract_from_index(file_paths, start, progress, cancel)
+            logger.info("The label index does not cover multi-image files, reading every file instead")
         unique_labels = set()
         file_label_map = {}
+        total = self._total_files()
 
-        for file_path in self.input_files:
+        for done, file_path in enumerate(file_paths, 1):
+            if cancel is not None and cancel.is_set():
+                logger.warning("Label extraction cancelled")
+                break
             try:
-                logging.debug(f"Reading file: {file_path}")
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
+                logger.debug("Reading file: %s", file_path)
+                for key, data in self._records(file_path):
                     file_labels = {shape['label'] for shape in data.get('shapes', [])}
                     unique_labels.update(file_labels)
-                    file_label_map[file_path] = sorted(file_labels)
-                    logging.info(f"Extracted labels from {file_path}: {file_labels}")
+                    file_label_map[key] = sorted(file_labels)
+                    logger.info("Extracted labels from %s: %s", key, file_labels)
             except Exception as e:
-                logging.error(f"Error reading file {file_path}: {e}")
-        
-        logging.info(f"Unique labels extracted: {sorted(unique_labels)}")
+                logger.error("Error reading file %s: %s", file_path, e)
+            if progress is not None:
+                progress(done, total)
+
+        if self.stats is not None:
+            self.stats.extract_seconds += time.perf_counter() - start
+        logger.info("Unique labels extracted: %s", sorted(unique_labels))
         return sorted(unique_labels), file_label_map
 
-    def convert_files(self):
-        # Convert JSON to YOLO txt
-        logging.info("Starting file conversion...")
-        results = {}
+    def _extract_from_index(self, file_paths, start, progress=None, cancel=None):
+        # Refresh the index for the input files, then answer from it
+        self.index.refresh(file_paths, self._load, progress, cancel)
+        file_label_map = self.index.file_labels(file_paths)
+        unique_labels = sorted({label for labels in file_label_map.values() for label in labels})
 
-        for file_path in self.input_files:
-            try:
-                if file_path.endswith('.json') and os.path.isfile(file_path):
-                    logging.info(f"Processing file: {file_path}")
-                    results[file_path] = self._process_file(file_path)
+        if self.stats is not None:
+            self.stats.extract_seconds += time.perf_counter() - start
+        logger.info("Unique labels extracted: %s", unique_labels)
+        return unique_labels, file_label_map
+
+    def convert_files(self, progress=None, cancel=None):
+        # Convert JSON to YOLO txt, returns {file_path: result} for every converted file.
+        # progress(done, total) is called as files finish, total is None for streamed inputs.
+        # Setting the cancel event (threading.Event) stops at the next file boundary
+        # (batch boundary with workers) and the results gathered so far are returned
+        return dict(self.iter_results(progress, cancel))
+
+    def iter_results(self, progress=None, cancel=None):
+        # Like convert_files, but yields (file_path, result) as files finish instead of keeping them all.
+        # The manifest is saved and stats are finalized once the generator is exhausted
+        logger.info("Starting file conversion...")
+        start = time.perf_counter()
+        total = self._total_files()
+        if self.workers > 1 and not (total is not None and total < 2):
+            yield from self._iter_parallel(progress, cancel)
+        else:
+            yield from self._iter_serial(self.input_files, progress, cancel)
+
+        if self.dedup is not None:
+            self.dedup.flush()
+        if self.manifest is not None:
+            self.stale_outputs = self.manifest.stale_outputs()
+            for output_file in self.stale_outputs:
+                logger.warning("Stale output, its input JSON no longer exists: %s", output_file)
+            self.manifest.save()
+
+        if self.stats is not None:
+            self.stats.convert_seconds += time.perf_counter() - start
+        logger.info("File conversion completed.")
+
+    def _total_files(self):
+        return len(self.input_files) if isinstance(self.input_files, list) else None
+
+    def _convert_serial(self, file_paths, progress=None, cancel=None):
+        # Convert files one after another in the current process
+        return dict(self._iter_serial(file_paths, progress, cancel))
+
+    def _iter_serial(self, file_paths, progress=None, cancel=None):
+        if self.read_ahead > 0:
+            yield from self._iter_pipelined(file_paths, progress, cancel)
+            return
+        total = self._total_files()
+
+        for done, file_path in enumerate(file_paths, 1):
+            if cancel is not None and cancel.is_set():
+                logger.warning("Conversion cancelled")
+                break
+            if self._is_multi_record(file_path):
+                yield from self._convert_records(file_path)
+            else:
+                result = self._convert_one(file_path)
+                if result is not None:
+                    yield file_path, result
+            if progress is not None:
+                progress(done, total)
+
+    def _convert_one(self, file_path):
+        # Result message for a single file, None if no reader handles it
+        file_start = time.perf_counter()
+        try:
+            if self._reader(file_path) is None or not os.path.isfile(file_path):
+                logger.warning("Skipping invalid file: %s", file_path)
+                return None
+            output_file = self._output_path(file_path)
+            if self.manifest is not None and self.manifest.is_up_to_date(
+                file_path, output_file, self.selected_labels, self._output_fingerprint()
+            ):
+                logger.debug("Skipping up-to-date file: %s", file_path)
+                result = f"Up to date: {output_file}"
+            else:
+                logger.info("Processing file: %s", file_path)
+                result = self._process_file(file_path)
+                if self.manifest is not None:
+                    self.manifest.record(file_path, output_file, self.selected_labels, self._output_fingerprint())
+            if self.stats is not None:
+                self.stats.file_done(file_path, time.perf_counter() - file_start)
+            return result
+        except Exception as e:
+            logger.error("Error converting file %s: %s", file_path, e)
+            if self.stats is not None:
+                self.stats.file_done(file_path, time.perf_counter() - file_start, failed=True)
+            return f"Error: {e}"
+
+    def _iter_pipelined(self, file_paths, progress=None, cancel=None):
+        # Serial conversion with the I/O overlapped, for network storage where every open and read waits:
+        # reader threads load up to read_ahead files ahead of the computation on this thread, and a writer
+        # thread writes the outputs behind it. The stages hand over through bounded deques of futures,
+        # so at most read_ahead files wait in each. The annotation cache is not used, it is not thread safe
+        logger.info("Pipelined conversion, %s files read ahead by %s threads", self.read_ahead, self.read_threads)
+        total = self._total_files()
+        files = iter(file_paths)
+        reads = deque()  # (file_path, read future), None for multi-image files converted in place
+        writes = deque()  # (file_path, result, write future, seconds), see _compute_stage
+        done = 0
+
+        with ThreadPoolExecutor(self.read_threads, thread_name_prefix="any2yolo-read") as readers, \
+                ThreadPoolExecutor(1, thread_name_prefix="any2yolo-write") as writer:
+            def read_next():
+                for file_path in islice(files, 1):
+                    multi_record = self._is_multi_record(file_path)
+                    reads.append((file_path, None if multi_record else readers.submit(self._read_stage, file_path)))
+
+            for _ in range(self.read_ahead):
+                read_next()
+            while reads:
+                if cancel is not None and cancel.is_set():
+                    logger.warning("Conversion cancelled, finishing the files being written")
+                    for _, future in reads:
+                        if future is not None:
+                            future.cancel()
+                    break
+                file_path, read = reads.popleft()
+                read_next()
+                if read is None:
+                    # Outputs stay in input order, so the files before it are finished first
+                    while writes:
+                        yield from self._finish_write(writes.popleft())
+                    yield from self._convert_records(file_path)
                 else:
-                    logging.warning(f"Skipping invalid file: {file_path}")
-            except Exception as e:
-                logging.error(f"Error converting file {file_path}: {e}")
-                results[file_path] = f"Error: {e}"
+                    writes.append(self._compute_stage(file_path, read, writer))
+                while writes and (len(writes) > self.read_ahead or writes[0][2] is None or writes[0][2].done()):
+                    yield from self._finish_write(writes.popleft())
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+            while writes:
+                yield from self._finish_write(writes.popleft())
 
-        logging.info("File conversion completed.")
-        return results
+    def _read_stage(self, file_path):
+        # Runs on a reader thread: what _convert_one does before computing, timed in the thread's own stats.
+        # Returns (data, result, stats, seconds), result is set instead of data for files needing no conversion
+        start = time.perf_counter()
+        stats = RunStats() if self.stats is not None else None
+        data = result = None
+        if self._reader(file_path) is None or not os.path.isfile(file_path):
+            logger.warning("Skipping invalid file: %s", file_path)
+        else:
+            output_file = self._output_path(file_path)
+            if self.manifest is not None and self.manifest.is_up_to_date(
+                file_path, output_file, self.selected_labels, self._output_fingerprint()
+            ):
+                logger.debug("Skipping up-to-date file: %s", file_path)
+                result = f"Up to date: {output_file}"
+            else:
+                logger.info("Processing file: %s", file_path)
+                data = self._load_into(file_path, stats)
+        return data, result, stats, time.perf_counter() - start
+
+    def _compute_stage(self, file_path, read, writer):
+        # Runs on the pipeline's thread: takes a read file's stats and computes its output, the writing
+        # goes to the writer thread. Returns (file_path, result, write future, seconds so far)
+        start = time.perf_counter()
+        try:
+            data, result, stats, seconds = read.result()
+            if stats is not None:
+                self.stats.merge(stats.to_dict())
+            if data is None:
+                return file_path, result, None, seconds
+            write = self._prepare_output(file_path, data)
+            return file_path, None, writer.submit(self._write_stage, file_path, write), seconds + time.perf_counter() - start
+        except Exception as e:
+            logger.error("Error converting file %s: %s", file_path, e)
+            return file_path, f"Error: {e}", None, time.perf_counter() - start
+
+    def _write_stage(self, file_path, write):
+        # Runs on the writer thread: (result, stats, seconds), the write timings go to the thread's own stats
+        start = time.perf_counter()
+        stats = self._thread_stats.stats = RunStats() if self.stats is not None else None
+        try:
+            result = write()
+            if self.manifest is not None:
+                self.manifest.record(
+                    file_path, self._output_path(file_path), self.selected_labels, self._output_fingerprint()
+                )
+        except Exception as e:
+            logger.error("Error converting file %s: %s", file_path, e)
+            result = f"Error: {e}"
+        return result, stats, time.perf_counter() - start
+
+    def _finish_write(self, entry):
+        # (file_path, result) of a computed file once its output is written, nothing for skipped files
+        file_path, result, write, seconds = entry
+        if write is not None:
+            result, stats, write_seconds = write.result()
+            if stats is not None:
+                self.stats.merge(stats.to_dict())
+            seconds += write_seconds
+        if result is None:
+            return
+        if self.stats is not None:
+            self.stats.file_done(file_path, seconds, failed=result.startswith("Error"))
+        yield file_path, result
+
+    def _convert_records(self, file_path):
+        # (key, result) for every image of a multi-image file, outputs are written under the key's folder
+        try:
+            for key, data in self._reader(file_path).records(file_path, self.stats):
+                file_start = time.perf_counter()
+                try:
+                    os.makedirs(os.path.dirname(self._output_path(key)), exist_ok=True)
+                    result = self._convert_data(key, data)
+                    failed = False
+                except Exception as e:
+                    logger.error("Error converting %s: %s", key, e)
+                    result = f"Error: {e}"
+                    failed = True
+                if self.stats is not None:
+                    self.stats.file_done(key, time.perf_counter() - file_start, failed=failed)
+                yield key, result
+        except Exception as e:
+            logger.error("Error reading file %s: %s", file_path, e)
+            yield file_path, f"Error: {e}"
+
+    def _reader(self, file_path):
+        return get_reader(self.input_format, file_path)
+
+    def _is_multi_record(self, file_path):
+        reader = self._reader(file_path)
+        return reader is not None and reader.multi_record
+
+    def _records(self, file_path):
+        # (key, summary) for every image of an input file
+        reader = self._reader(file_path)
+        if reader is None:
+            raise ValueError(f"No reader for {file_path}")
+        if reader.multi_record:
+            yield from reader.records(file_path, self.stats)
+        else:
+            yield file_path, self._load(file_path)
+
+    def _iter_parallel(self, progress=None, cancel=None):
+        # Spread batches of files over a process pool, results keep input order
+        # Workers parse on their own, the cache only lives in this process.
+        # Batches are submitted lazily with a bounded number in flight, so streamed inputs never pile up
+        logger.info("Converting with %s workers in batches of %s files", self.workers, self._chunk_size())
+        pending = deque()
+        total = self._total_files()
+        done = 0
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            for chunk in self._chunks():
+                if cancel is not None and cancel.is_set():
+                    break
+                manifest_entries = self.manifest.subset(chunk) if self.manifest is not None else None
+                future = executor.submit(
+                    _convert_chunk, type(self), self._worker_options(), chunk, manifest_entries, self.stats is not None
+                )
+                pending.append((future, len(chunk)))
+                if len(pending) >= self.workers * 2:
+                    chunk_results, done = self._collect_chunk(pending.popleft(), done, progress, total)
+                    yield from chunk_results.items()
+
+            if cancel is not None and cancel.is_set():
+                logger.warning("Conversion cancelled, waiting for running batches")
+                for future, _ in pending:
+                    future.cancel()
+            while pending:
+                chunk_results, done = self._collect_chunk(pending.popleft(), done, progress, total)
+                yield from chunk_results.items()
+
+    def _collect_chunk(self, submitted, done, progress, total):
+        # Merge a finished batch's issues, manifest entries and stats, returns its results and the updated file count
+        future, chunk_length = submitted
+        if future.cancelled():
+            return {}, done
+        chunk_results, chunk_issues, chunk_entries, chunk_stats = future.result()
+        for issue in chunk_issues:
+            self._report_issue(issue)
+        if chunk_entries is not None:
+            self.manifest.update(chunk_entries)
+        if chunk_stats is not None:
+            self.stats.merge(chunk_stats)
+        done += chunk_length
+        if progress is not None:
+            progress(done, total)
+        return chunk_results, done
+
+    def _worker_options(self):
+        # Constructor arguments a worker process needs to convert like this converter
+        return {
+            "selected_labels": self.selected_labels, "check_image_size": self.check_image_size,
+            "validate": self.validate, "min_box_size": self.min_box_size,
+            # An in-memory index cannot be shared, workers then deduplicate within their own batches
+            "dedup": self.dedup.path if self.dedup is not None else None,
+            "input_format": self.input_format, "output_mode": self.output_mode,
+            "simplify": self.simplify, "simplify_relative": self.simplify_relative,
+            "read_ahead": self.read_ahead, "read_threads": self.read_threads,
+        }
+
+    def _chunks(self):
+        # Split the input files into batches without materializing iterables
+        files = iter(self.input_files)
+        chunk_size = self._chunk_size()
+        while True:
+            chunk = list(islice(files, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _chunk_size(self):
+        # Batch enough files per task to amortize IPC, while keeping every worker busy
+        if self.chunk_size:
+            return self.chunk_size
+        if not isinstance(self.input_files, list):
+            return STREAM_CHUNK_SIZE
+        per_worker = len(self.input_files) // (self.workers * 4)
+        return max(1, min(MAX_CHUNK_SIZE, per_worker))
+
+    def _load(self, file_path):
+        # Parsed annotation for a single-image file, served from the cache when available
+        return self._load_into(file_path, self.stats, self.cache)
+
+    def _load_into(self, file_path, stats, cache=None):
+        # Like _load, with the timings going to the given stats (e.g. a reader thread's own)
+        reader = self._reader(file_path)
+        load = reader.load if reader is not None else load_annotation
+        if stats is None:
+            return cache.get(file_path, load=load) if cache is not None else load(file_path)
+
+        # Parse time is the load time minus what the reader spent in read()
+        start = time.perf_counter()
+        read_before = stats.seconds["read"]
+        data = cache.get(file_path, stats, load) if cache is not None else load(file_path, stats)
+        read_seconds = stats.seconds["read"] - read_before
+        stats.add("parse", time.perf_counter() - start - read_seconds)
+        return data
+
+    def _timer(self, stage):
+        stats = getattr(self._thread_stats, "stats", self.stats)
+        return stats.timer(stage) if stats is not None else nullcontext()
+
+    def _output_path(self, file_path):
+        # The YOLO txt is written next to its annotation file
+        if file_path.endswith('.json'):
+            return file_path.replace('.json', '.txt')
+        return os.path.splitext(file_path)[0] + '.txt'
 
     def _process_file(self, file_path):
         # Convert a single JSON file to YOLO txt
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            return self._convert_data(file_path, self._load(file_path))
+        except Exception as e:
+            logger.error("Error processing file %s: %s", file_path, e)
+            raise
+
+    def _convert_data(self, file_path, data):
+        # Write the YOLO txt for an already parsed annotation
+        return self._prepare_output(file_path, data)()
 
-            output_file = file_path.replace('.json', '.txt')
-            with open(output_file, 'w') as out_file:
-                has_data = False
-                for shape in data.get('shapes', []):
-                    if shape['shape_type'] == "polygon" and shape['label'] in self.selected_labels:
-                        has_data = self._write_polygon_data(shape, data, out_file) or has_data
+    def _prepare_output(self, file_path, data):
+        # Compute the output of a parsed annotation. Returns a function writing it and returning the
+        # result message, so the pipelined mode can run the writes on its writer thread
+        with self._timer("compute"):
+            text, shape_count = self._format_polygon_data(file_path, data)
+        if self.stats is not None:
+            self.stats.shapes += shape_count
+        if not text:
+            logger.warning("No valid polygons found in file: %s", file_path)
 
-                if not has_data:
-                    out_file.write("# No valid polygons found in this file.\n")
-                    logging.warning(f"No valid polygons found in file: {file_path}")
+        output_file = self._output_path(file_path)
 
-            logging.info(f"Successfully converted {file_path} to {output_file}")
+        def write():
+            with self._timer("write"):
+                with open(output_file, 'w') as out_file:
+                    out_file.write(text or "# No valid polygons found in this file.\n")
+            logger.info("Successfully converted %s to %s", file_path, output_file)
             return f"Converted to {output_file}"
-        except Exception as e:
-            logging.error(f"Error processing file {file_path}: {e}")
-            raise
+        return write
 
-    def _write_polygon_data(self, shape, data, out_file):
-        # Write YOLO format polygon data to output
+    def _image_size(self, file_path, data):
+        # Image (width, height) for normalizing, from the JSON or probed from the image header
+        width, height = data.get('imageWidth'), data.get('imageHeight')
+        if width and height and not self.check_image_size:
+            return width, height
+
+        image_path = find_image(file_path, data)
+        if image_path is None:
+            if width and height:
+                logger.warning("Cannot check the image size of %s, no image found", file_path)
+                return width, height
+            raise ValueError(f"imageWidth/imageHeight missing and no image found for {file_path}")
         try:
-            points = shape['points']
-            x_coords = [p[0] for p in points]
-            y_coords = [p[1] for p in points]
-            x_min, x_max = min(x_coords), max(x_coords)
-            y_min, y_max = min(y_coords), max(y_coords)
-
-            dw = 1.0 / data['imageWidth']
-            dh = 1.0 / data['imageHeight']
-            x_center = (x_min + x_max) / 2.0 * dw
-            y_center = (y_min + y_max) / 2.0 * dh
-            w = (x_max - x_min) * dw
-            h = (y_max - y_min) * dh
-
-            class_label = self.selected_labels.index(shape['label'])
-            out_file.write(f"{class_label} {x_center} {y_center} {w} {h}\n")
-            logging.debug(f"Written polygon data for label {shape['label']}: {class_label} {x_center} {y_center} {w} {h}")
-            return True
-        except ValueError as e:
-            logging.warning(f"Label {shape['label']} not found in selected labels: {e}")
-            return False
+            with self._timer("read"):
+                real_size = self.image_sizes.get(image_path)
+        except (OSError, ValueError) as e:
+            if not (width and height):
+                raise
+            # The check is advisory, a file with a stored size still converts
+            logger.warning("Cannot check the image size of %s: %s", file_path, e)
+            return width, height
+
+        if not (width and height):
+            logger.debug("Using the size of %s for %s", image_path, file_path)
+            return real_size
+        if (width, height) != real_size:
+            # The points were drawn on an image of the stored size, so it is kept
+            logger.warning(
+                "Image size mismatch in %s: JSON says %sx%s, %s is %sx%s", file_path, width, height, image_path, *real_size
+            )
+            if self.stats is not None:
+                self.stats.size_mismatches += 1
+        return width, height
+
+    def _select_polygons(self, data):
+        # Points, class ids and index in "shapes" of every selected polygon of a file
+        polygons = []
+        classes = []
+        shape_indices = []
+        for shape_index, shape in enumerate(data.get('shapes', [])):
+            if shape['shape_type'] != "polygon" or shape['label'] not in self.class_ids:
+                continue
+            if shape['points']:
+                polygons.append(shape['points'])
+                classes.append(self.class_ids[shape['label']])
+                shape_indices.append(shape_index)
+            else:
+                logger.warning("Skipping polygon without points for label %s", shape['label'])
+        return polygons, classes, shape_indices
+
+    def _format_polygon_data(self, file_path, data):
+        # YOLO lines (boxes or polygons) for every selected polygon of a file, computed in one batch
+        # Returns the text to write and the number of shapes in it
+        polygons, classes, shape_indices = self._select_polygons(data)
+        if not polygons:
+            return "", 0
+
+        try:
+            points, offsets = pack_polygons(polygons)
+            image_width, image_height = self._image_size(file_path, data)
+            key = None
+            if self.dedup is not None:
+                key = payload_key(self._output_fingerprint(), points, offsets, classes, image_width, image_height)
+                cached = self.dedup.get(key)
+                if cached is not None:
+                    text, shape_count, issues = cached
+                    self._add_issues(file_path, data, shape_indices, issues)
+                    if self.stats is not None:
+                        self.stats.dedup_hits += 1
+                    logger.debug("Reused the output of an identical payload for %s", file_path)
+                    return text, shape_count
+
+            issues = []
+            if self.validate:
+                points, keep, issue_masks = validate_polygons(
+                    points, offsets, image_width, image_height, self.min_box_size
+                )
+                issues = self._collect_issues(keep, issue_masks)
+                self._add_issues(file_path, data, shape_indices, issues)
+            kept = keep if self.validate and not keep.all() else None
+            if kept is not None:
+                classes = [class_label for class_label, is_kept in zip(classes, keep.tolist()) if is_kept]
+            text = self._format_lines(points, offsets, classes, image_width, image_height, kept)
+            if key is not None:
+                self.dedup.put(key, text, len(classes), issues)
+            logger.debug("Formatted %s polygons", len(classes))
+            return text, len(classes)
         except Exception as e:
-            logging.error(f"Error writing polygon data: {e}")
+            logger.error("Error computing polygon data: %s", e)
             raise
+
+    def _format_lines(self, points, offsets, classes, image_width, image_height, kept=None):
+        # YOLO text of packed polygons in the output mode. kept masks out dropped polygons,
+        # classes only holds the kept ones
+        if self.output_mode != "detect":
+            return self._polygon_text(points, offsets, classes, image_width, image_height, kept)
+        boxes = bounding_boxes(points, offsets, image_width, image_height)
+        if kept is not None:
+            boxes = boxes[kept]
+        return "".join(
+            f"{class_label} {x_center} {y_center} {w} {h}\n"
+            for class_label, (x_center, y_center, w, h) in zip(classes, boxes.tolist())
+        )
+
+    def _polygon_text(self, points, offsets, classes, image_width, image_height, kept=None):
+        # "class x1 y1 x2 y2 ..." per polygon, or per rotated rectangle in obb mode. All coordinates of the
+        # file are normalized in one array operation and formatted by a single % over a template of every line
+        counts = np.diff(offsets)
+        if kept is not None:
+            points = points[np.repeat(kept, counts)]
+            counts = counts[kept]
+        if self.output_mode == "obb":
+            points = min_area_rectangles(points, polygon_offsets(counts)).reshape(-1, 2)
+            counts = np.full(len(counts), 4)
+        elif self.simplify > 0:
+            points, counts = self._simplify(points, counts, image_width, image_height)
+        normalized = normalize_points(points, image_width, image_height)
+        if self.output_mode == "obb":
+            # Rotated corners of objects at the border leave the image, Ultralytics rejects labels beyond it
+            normalized = np.clip(normalized, 0.0, 1.0) + 0.0  # + 0.0 turns -0.0 into 0.0
+        template = "".join(
+            f"{class_label}{POLYGON_COORDINATE * count}\n" for class_label, count in zip(classes, (counts * 2).tolist())
+        )
+        return template % tuple(normalized.ravel().tolist())
+
+    def _simplify(self, points, counts, image_width, image_height):
+        # Points and per-polygon point counts after simplification
+        tolerance = self.simplify
+        if self.simplify_relative:
+            tolerance *= float(np.hypot(image_width, image_height))
+        simplified, simplified_offsets = simplify_polygons(points, polygon_offsets(counts), tolerance)
+        if self.stats is not None:
+            self.stats.vertices_before_simplify += len(points)
+            self.stats.vertices_after_simplify += len(simplified)
+        return simplified, np.diff(simplified_offsets)
+
+    def _output_fingerprint(self):
+        # Options that change the output for the same payload, part of dedup keys and manifest entries
+        return (
+            f"{type(self).__name__}|validate={self.validate}|min_box_size={self.min_box_size}"
+            f"|mode={self.output_mode}|simplify={self.simplify}|relative={self.simplify_relative}"
+        )
+
+    @staticmethod
+    def _collect_issues(keep, issue_masks):
+        # [(polygon position, issue names, action)] of the polygons validation repaired or dropped
+        flagged = np.zeros(len(keep), dtype=bool)
+        for mask in issue_masks.values():
+            flagged |= mask
+        return [
+            (position, [name for name, mask in issue_masks.items() if mask[position]],
+             "clipped" if keep[position] else "dropped")
+            for position in np.flatnonzero(flagged).tolist()
+        ]
+
+    def _add_issues(self, file_path, data, shape_indices, issues):
+        # Add an entry per polygon with issues: file, index in "shapes", label, issue names and action taken
+        for position, names, action in issues:
+            shape_index = shape_indices[position]
+            entry = {
+                "file": file_path,
+                "shape": shape_index,
+                "label": data['shapes'][shape_index]['label'],
+                "issues": names,
+                "action": action,
+            }
+            self._report_issue(entry)
+            logger.warning("Shape %s (%s) in %s %s: %s", shape_index, entry["label"], file_path, action, ", ".join(names))
+
+    def _report_issue(self, issue):
+        if len(self.issues) < ISSUE_SAMPLE_SIZE:
+            self.issues.append(issue)
+        if self.on_issue is not None:
+            self.on_issue(issue)
@@ -0,0 +1,90 @@
+# Pluggable JSON decoding backends
+
+# The fastest installed parser is used, with the same results as the stdlib:
+# - msgspec: typed decoding of the AnyLabeling schema, only the fields the converter reads are built
+# - orjson: fast generic decoding
+# - json: stdlib fallback, always available
+# ANY2YOLO_JSON_BACKEND=msgspec|orjson|json forces a backend
+import os
+import json
+import logging
+from typing import List, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger("Any2YOLO.decoders")
+
+AVAILABLE_BACKENDS = [name for name, module in (("msgspec", msgspec), ("orjson", orjson)) if module] + ["json"]
+
+
+def _select_backend():
+    requested = os.environ.get("ANY2YOLO_JSON_BACKEND", "").lower()
+    if requested in AVAILABLE_BACKENDS:
+        return requested
+    if requested:
+        logger.warning("JSON backend %s is not available, using %s", requested, AVAILABLE_BACKENDS[0])
+    return AVAILABLE_BACKENDS[0]
+
+
+JSON_BACKEND = _select_backend()
+
+
+def decode(raw):
+    # Generic JSON decoding of bytes, identical to json.loads
+    if orjson is not None and JSON_BACKEND != "json":
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN or integers beyond 64 bits, which the stdlib accepts
+    return json.loads(raw)
+
+
+if msgspec is not None:
+    class _Shape(msgspec.Struct):
+        label: str
+        points: list
+        shape_type: str
+
+    class _Annotation(msgspec.Struct):
+        # Unknown keys (imageData, flags, version...) are skipped without being built
+        shapes: List[_Shape] = []
+        imageWidth: Union[int, float, None, msgspec.UnsetType] = msgspec.UNSET
+        imageHeight: Union[int, float, None, msgspec.UnsetType] = msgspec.UNSET
+        imagePath: Union[str, None, msgspec.UnsetType] = msgspec.UNSET
+
+    _annotation_decoder = msgspec.json.Decoder(_Annotation)
+
+
+def _decode_typed(raw):
+    # AnyLabeling summary dict straight from the typed schema
+    document = _annotation_decoder.decode(raw)
+    data = {
+        "shapes": [
+            {"label": shape.label, "points": shape.points, "shape_type": shape.shape_type}
+            for shape in document.shapes
+        ]
+    }
+    for key in ("imageWidth", "imageHeight", "imagePath"):
+        value = getattr(document, key)
+        if value is not msgspec.UNSET:
+            data[key] = value
+    return data
+
+
+def decode_annotation(raw):
+    # Decode an AnyLabeling document, typed when msgspec is the backend.
+    # Documents that do not match the schema go through the generic decoder
+    if JSON_BACKEND == "msgspec":
+        try:
+            return _decode_typed(raw)
+        except msgspec.DecodeError:
+            pass
+    return decode(raw)
@@ -0,0 +1,95 @@
+# Content-addressed deduplication of conversion results
+
+# Exports often repeat the same annotation (video frames, re-exported folders).
+# The converter hashes what decides a file's output (packed points, class ids,
+# image size and its options) and stores the YOLO text under that hash, so
+# every later file with the same payload reuses it instead of recomputing.
+# The store is an SQLite database, shared by worker processes and kept between runs
+import json
+import sqlite3
+import hashlib
+import logging
+
+logger = logging.getLogger("Any2YOLO.dedup")
+
+DEDUP_VERSION = 1
+# New results are written in batches, one transaction per batch
+FLUSH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key BLOB PRIMARY KEY,
+    text TEXT NOT NULL,
+    shapes INTEGER NOT NULL,
+    issues TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def payload_key(fingerprint, points, offsets, classes, image_width, image_height):
+    # Hash of everything a file's output depends on, points are hashed as packed float64 bytes
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{DEDUP_VERSION}|{fingerprint}|{image_width}|{image_height}|{len(offsets)}|".encode('utf-8'))
+    digest.update(points.tobytes())
+    digest.update(offsets.tobytes())
+    digest.update(",".join(map(str, classes)).encode('ascii'))
+    return digest.digest()
+
+
+class DedupIndex:
+    # Payload hash -> (YOLO text, shape count, validation issues)
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        # check_same_thread: the GUI creates converters on the Tk thread and runs them on a worker thread
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, DEDUP_VERSION):
+                logger.warning("Clearing dedup index %s with unsupported version %s", path, version)
+                self._connection.execute("DROP TABLE IF EXISTS results")
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {DEDUP_VERSION}")
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # (text, shapes, issues) stored for a payload, None if it was never converted
+        entry = self._pending.get(key)
+        if entry is None:
+            row = self._connection.execute(
+                "SELECT text, shapes, issues FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], row[1], json.loads(row[2]))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, text, shapes, issues):
+        # issues: [(polygon position, issue names, action)] as recorded for the first file
+        self._pending[key] = (text, shapes, issues)
+        if len(self._pending) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        rows = [(key, text, shapes, json.dumps(issues)) for key, (text, shapes, issues) in self._pending.items()]
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+        logger.debug("Stored %s new results in the dedup index", len(rows))
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def __len__(self):
+        self.flush()
+        return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
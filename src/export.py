@@ -0,0 +1,199 @@
+# Full YOLO dataset export
+
+# Builds the layout Ultralytics expects, next to nothing is copied:
+#   <output_dir>/images/<split>/<name>.<ext>   image, hardlinked or symlinked when possible
+#   <output_dir>/labels/<split>/<name>.txt     YOLO labels
+#   <output_dir>/data.yaml                     split folders and class names in selected_labels order
+# Files are assigned to train/val/test by hashing their name below source_root, so a file keeps its split
+# between runs with the same root. Outputs of earlier exports that a run no longer writes are reported as stale
+import os
+import json
+import shutil
+import hashlib
+import logging
+from converter import JSONToTXTConverter
+from imagesize import find_image
+
+logger = logging.getLogger("Any2YOLO.export")
+
+SPLIT_NAMES = ("train", "val", "test")
+DEFAULT_SPLITS = (0.8, 0.2, 0.0)
+LINK_MODES = {
+    "hardlink": ("hardlink", "symlink", "copy"),
+    "symlink": ("symlink", "copy"),
+    "copy": ("copy",),
+}
+
+
+def place_file(source, destination, link_mode="hardlink"):
+    # Put source at destination with the cheapest method that works, returns the method used
+    if os.path.lexists(destination):
+        if os.path.exists(destination):
+            if os.path.samefile(source, destination):
+                return "existing"
+            source_stat, destination_stat = os.stat(source), os.stat(destination)
+            if (source_stat.st_size, source_stat.st_mtime_ns) == (destination_stat.st_size, destination_stat.st_mtime_ns):
+                return "existing"
+        os.remove(destination)
+
+    error = None
+    for method in LINK_MODES[link_mode]:
+        try:
+            if method == "hardlink":
+                os.link(source, destination)
+            elif method == "symlink":
+                os.symlink(os.path.abspath(source), destination)
+            else:
+                shutil.copy2(source, destination)
+            return method
+        except OSError as e:
+            # e.g. another filesystem for hardlinks, no privilege for symlinks on Windows
+            error = e
+    raise error
+
+
+def _yaml_string(value):
+    # JSON strings are valid YAML double-quoted scalars
+    return json.dumps(value, ensure_ascii=False)
+
+
+class DatasetExporter(JSONToTXTConverter):
+    # Converts annotations straight into a train/val/test YOLO dataset
+
+    def __init__(
+        self, input_files, selected_labels, output_dir, splits=DEFAULT_SPLITS, seed=0,
+        link_mode="hardlink", source_root=None, find_stale=True, remove_stale=False, **kwargs
+    ):
+        super().__init__(input_files, selected_labels, **kwargs)
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode}, expected one of {', '.join(LINK_MODES)}")
+        if len(splits) > len(SPLIT_NAMES) or sum(splits) <= 0 or min(splits) < 0:
+            raise ValueError(f"Invalid split ratios {splits}")
+
+        self.output_dir = output_dir
+        self.splits = tuple(splits)
+        self.seed = seed
+        self.link_mode = link_mode
+        # Sub-folders below source_root are kept, so equal file names in different folders do not clash.
+        # Names and splits are relative to it, the default common folder of the inputs moves with the input set
+        if source_root is None and isinstance(self.input_files, list) and self.input_files:
+            source_root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in self.input_files])
+        self.source_root = source_root
+        # After a complete run, files in the split folders that no input of the run wrote are listed in
+        # stale_outputs (and deleted with remove_stale), e.g. after the sources, ratios or seed changed.
+        # Sharded runs share the output folder with the other shards and turn this off
+        self.find_stale = find_stale
+        self.remove_stale = remove_stale
+
+    def iter_results(self, progress=None, cancel=None):
+        for split in self._active_splits():
+            os.makedirs(os.path.join(self.output_dir, "images", split), exist_ok=True)
+            os.makedirs(os.path.join(self.output_dir, "labels", split), exist_ok=True)
+        written = set()
+        for file_path, result in super().iter_results(progress, cancel):
+            # Failed files count as written, their outputs of an earlier run are kept
+            written.add(f"{self.split_for(file_path)}/{self._relative_name(file_path)}")
+            yield file_path, result
+        self.write_data_yaml()
+        if self.find_stale and not (cancel is not None and cancel.is_set()):
+            self.stale_outputs = list(dict.fromkeys(self.stale_outputs + self._find_stale_outputs(written)))
+            for output_file in self.stale_outputs:
+                if self.remove_stale:
+                    os.remove(output_file)
+                    logger.info("Removed stale output %s", output_file)
+                else:
+                    logger.warning("Stale output, no file of this export writes it: %s", output_file)
+
+    def _find_stale_outputs(self, written):
+        # Label and image files of every split folder whose "<split>/<name>" is not in written
+        stale = []
+        for kind in ("labels", "images"):
+            for split in SPLIT_NAMES:
+                folder = os.path.join(self.output_dir, kind, split)
+                for directory, subdirectories, file_names in os.walk(folder):
+                    subdirectories.sort()
+                    for file_name in sorted(file_names):
+                        output_file = os.path.join(directory, file_name)
+                        stem = os.path.splitext(os.path.relpath(output_file, folder))[0].replace(os.sep, "/")
+                        if f"{split}/{self._source_name(stem)}" not in written:
+                            stale.append(output_file)
+        return stale
+
+    def _source_name(self, output_stem):
+        # Relative name of the input an output file belongs to, see _relative_name
+        return output_stem
+
+    def write_data_yaml(self):
+        # Dataset description read by Ultralytics
+        lines = [f"path: {_yaml_string(os.path.abspath(self.output_dir))}"]
+        for split in self._active_splits():
+            lines.append(f"{split}: images/{split}")
+        lines.append("names:")
+        lines += [f"  {class_id}: {_yaml_string(label)}" for class_id, label in enumerate(self.selected_labels)]
+
+        yaml_path = os.path.join(self.output_dir, "data.yaml")
+        with open(yaml_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        logger.info("Wrote %s", yaml_path)
+        return yaml_path
+
+    def split_for(self, file_path):
+        # Stable split for a file: a hash of its name mapped onto the cumulative ratios
+        name = self._relative_name(file_path)
+        digest = hashlib.sha1(f"{self.seed}:{name}".encode('utf-8')).digest()
+        position = int.from_bytes(digest[:8], 'big') / 2 ** 64 * sum(self.splits)
+        cumulative = 0.0
+        for split, ratio in zip(SPLIT_NAMES, self.splits):
+            cumulative += ratio
+            if position < cumulative:
+                return split
+        return self._active_splits()[-1]
+
+    def _active_splits(self):
+        return [split for split, ratio in zip(SPLIT_NAMES, self.splits) if ratio > 0]
+
+    def _relative_name(self, file_path):
+        # Output name without extension, keeping sub-folders below source_root
+        stem = os.path.splitext(file_path)[0]
+        if self.source_root:
+            relative = os.path.relpath(os.path.abspath(stem), self.source_root)
+            if not relative.startswith(os.pardir):
+                return relative.replace(os.sep, "/")
+        return os.path.basename(stem)
+
+    def _output_path(self, file_path):
+        name = self._relative_name(file_path)
+        return os.path.join(self.output_dir, "labels", self.split_for(file_path), *name.split("/")) + ".txt"
+
+    def _worker_options(self):
+        options = super()._worker_options()
+        options.update(
+            output_dir=self.output_dir, splits=self.splits, seed=self.seed,
+            link_mode=self.link_mode, source_root=self.source_root,
+        )
+        return options
+
+    def _prepare_output(self, file_path, data):
+        # The image is placed before the label is written, a label without its image is useless to YOLO
+        image_path = self._find_image(file_path, data)
+        name = self._relative_name(file_path)
+        destination = os.path.join(
+            self.output_dir, "images", self.split_for(file_path), *name.split("/")
+        ) + os.path.splitext(image_path)[1].lower()
+        write_label = super()._prepare_output(file_path, data)
+
+        def write():
+            if "/" in name:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                os.makedirs(os.path.dirname(self._output_path(file_path)), exist_ok=True)
+            with self._timer("write"):
+                method = place_file(image_path, destination, self.link_mode)
+            logger.debug("Placed %s at %s (%s)", image_path, destination, method)
+            return write_label()
+        return write
+
+    def _find_image(self, file_path, data):
+        image_path = find_image(file_path, data)
+        if image_path is None:
+            raise FileNotFoundError(f"No image found for {file_path}")
+        return image_path
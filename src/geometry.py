@@ -0,0 +1,421 @@
+# Vectorized polygon geometry used by the converter
+
+# Polygons are packed into one flat (N, 2) point array plus start offsets,
+# so per-polygon reductions run once per file instead of once per shape
+from itertools import chain
+import numpy as np
+
+# Point pairs compared per block when linking the parts of a multi-part polygon
+CLOSEST_PAIR_BLOCK = 1 << 20
+
+
+def pack_polygons(polygons):
+    # Gather lists of [x, y] points into a float array and the offset of each polygon
+    point_list = list(chain.from_iterable(polygons))
+    if set(map(len, point_list)) == {2}:
+        flat = np.fromiter(chain.from_iterable(point_list), dtype=np.float64, count=2 * len(point_list))
+        points = flat.reshape(-1, 2)
+    else:
+        # Points carrying extra values, keep x and y only
+        points = np.array([(point[0], point[1]) for point in point_list], dtype=np.float64)
+
+    offsets = np.zeros(len(polygons) + 1, dtype=np.intp)
+    np.cumsum([len(polygon) for polygon in polygons], out=offsets[1:])
+    return points, offsets
+
+
+def polygon_offsets(counts):
+    # Offsets of packed polygons from their point counts
+    offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def bounding_boxes(points, offsets, image_width, image_height):
+    # Normalized YOLO boxes (x_center, y_center, w, h) for every packed polygon
+    # Every polygon must hold at least one point
+    starts = offsets[:-1]
+    x_min = np.minimum.reduceat(points[:, 0], starts)
+    x_max = np.maximum.reduceat(points[:, 0], starts)
+    y_min = np.minimum.reduceat(points[:, 1], starts)
+    y_max = np.maximum.reduceat(points[:, 1], starts)
+
+    dw = 1.0 / image_width
+    dh = 1.0 / image_height
+    return np.column_stack((
+        (x_min + x_max) / 2.0 * dw,
+        (y_min + y_max) / 2.0 * dh,
+        (x_max - x_min) * dw,
+        (y_max - y_min) * dh,
+    ))
+
+
+def normalize_points(points, image_width, image_height):
+    # Every packed point scaled to 0-1 image coordinates, in one array operation
+    return points * np.array([1.0 / image_width, 1.0 / image_height])
+
+
+def validate_polygons(points, offsets, image_width, image_height, min_size=0.0, min_points=3):
+    # Check every packed polygon against the image, in one batch
+    # Returns the points clipped to the image, a keep mask and {issue: mask} of the polygons with that issue.
+    # "clipped" polygons are repaired and kept, every other issue drops the polygon
+    starts = offsets[:-1]
+    finite = np.isfinite(points).all(axis=1)
+    non_finite = ~np.logical_and.reduceat(finite, starts)
+    points = np.where(finite[:, None], points, 0.0)
+
+    clipped_points = np.clip(points, 0.0, [image_width, image_height])
+    moved = (clipped_points != points).any(axis=1)
+    clipped = np.logical_or.reduceat(moved, starts)
+
+    width = np.maximum.reduceat(clipped_points[:, 0], starts) - np.minimum.reduceat(clipped_points[:, 0], starts)
+    height = np.maximum.reduceat(clipped_points[:, 1], starts) - np.minimum.reduceat(clipped_points[:, 1], starts)
+    too_few_points = np.diff(offsets) < min_points
+    zero_area = (width <= 0) | (height <= 0)
+    too_small = ~zero_area & ((width < min_size) | (height < min_size))
+
+    issues = {
+        "non_finite": non_finite,
+        "too_few_points": too_few_points & ~non_finite,
+        "zero_area": zero_area & ~non_finite & ~too_few_points,
+        "too_small": too_small & ~non_finite & ~too_few_points,
+        "clipped": clipped & ~non_finite,
+    }
+    keep = ~(non_finite | too_few_points | zero_area | too_small)
+    return clipped_points, keep, issues
+
+
+
+def _segment_points(starts, ends):
+    # Index of every point strictly between each (start, end) pair, the segment it belongs to
+    # and where each segment's points begin. Every segment must have at least one such point
+    interior = ends - starts - 1
+    group_starts = np.zeros(len(starts), dtype=np.intp)
+    np.cumsum(interior[:-1], out=group_starts[1:])
+    group_ids = np.repeat(np.arange(len(starts)), interior)
+    indices = np.arange(len(group_ids)) - group_starts[group_ids] + starts[group_ids] + 1
+    return indices, group_ids, group_starts
+
+
+def _first_max_positions(values, group_starts, group_ids):
+    # Position in values of the first maximum of every group, and the maxima.
+    # NaN counts as infinitely far, so broken points are never simplified away
+    values = np.nan_to_num(values, nan=np.inf)
+    maxima = np.maximum.reduceat(values, group_starts)
+    candidates = np.flatnonzero(values == maxima[group_ids])
+    _, first = np.unique(group_ids[candidates], return_index=True)
+    return candidates[first], maxima
+
+
+def simplify_polygons(points, offsets, tolerance):
+    # Douglas-Peucker simplification of every packed polygon in one batch. Each round splits the open
+    # segments of all polygons at once, so there are as many rounds as the recursion is deep, not one per point.
+    # Polygons start as two chains, split at the point farthest from their first point, so a simplified
+    # polygon keeps at least 3 points. Returns the kept points and their offsets
+    counts = np.diff(offsets)
+    keep = np.repeat(counts <= 3, counts)  # Nothing to gain below 4 points
+    dense = counts > 3
+    starts = offsets[:-1][dense]
+    ends = offsets[1:][dense] - 1
+    keep[starts] = True
+    keep[ends] = True
+
+    if len(starts):
+        indices, group_ids, group_starts = _segment_points(starts, ends)
+        offset = points[indices] - points[starts][group_ids]
+        positions, _ = _first_max_positions(np.hypot(offset[:, 0], offset[:, 1]), group_starts, group_ids)
+        splits = indices[positions]
+        keep[splits] = True
+        starts, ends = np.concatenate((starts, splits)), np.concatenate((splits, ends))
+
+    while True:
+        has_interior = ends - starts > 1
+        starts, ends = starts[has_interior], ends[has_interior]
+        if not len(starts):
+            break
+        indices, group_ids, group_starts = _segment_points(starts, ends)
+        a = points[starts][group_ids]
+        chord = points[ends][group_ids] - a
+        relative = points[indices] - a
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        cross = np.abs(chord[:, 0] * relative[:, 1] - chord[:, 1] * relative[:, 0])
+        # A chord between two equal points measures the distance to that point
+        distances = np.where(
+            length > 0, cross / np.where(length > 0, length, 1.0), np.hypot(relative[:, 0], relative[:, 1])
+        )
+        positions, maxima = _first_max_positions(distances, group_starts, group_ids)
+        split = maxima > tolerance
+        splits = indices[positions[split]]
+        keep[splits] = True
+        starts, ends = np.concatenate((starts[split], splits)), np.concatenate((splits, ends[split]))
+
+    kept_counts = np.bincount(np.repeat(np.arange(len(counts)), counts)[keep], minlength=len(counts))
+    return points[keep], polygon_offsets(kept_counts)
+
+
+def _outside(ax, ay, bx, by, x, y):
+    # How far each point (x, y) lies right of its directed edge a -> b (twice the triangle area),
+    # positive outside a counter-clockwise hull
+    return (x - ax) * (by - ay) - (y - ay) * (bx - ax)
+
+
+def _extreme_points(xs, ys, starts, group_ids, sign):
+    # Position of every group's lowest (x, y) point, or its highest with sign -1
+    keys_x, keys_y = sign * xs, sign * ys
+    x_min = np.minimum.reduceat(keys_x, starts)
+    positions, _ = _first_max_positions(np.where(keys_x == x_min[group_ids], -keys_y, -np.inf), starts, group_ids)
+    return positions
+
+
+def convex_hulls(points, offsets):
+    # Convex hull of every packed polygon, counter-clockwise from its lowest (x, y) point without repeated or
+    # collinear points. Batched Quickhull: the hull starts as the edges between the lowest and highest point,
+    # each round splits the open edges of all polygons at once at their farthest outside point and drops the
+    # points that fell inside, so there are as many rounds as the splitting is deep
+    counts = np.diff(offsets)
+    polygons = np.flatnonzero(counts > 0)
+    polygon_ids = np.repeat(np.arange(len(polygons)), counts[polygons])
+    xs, ys = np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1])
+    starts = offsets[:-1][polygons]
+    lowest = _extreme_points(xs, ys, starts, polygon_ids, 1)
+    highest = _extreme_points(xs, ys, starts, polygon_ids, -1)
+    split = (xs[lowest] != xs[highest]) | (ys[lowest] != ys[highest])
+
+    # Hull vertices as (point, polygon, chain): chain 0 runs from the lowest point along the bottom,
+    # chain 1 from the highest point back along the top
+    vertices = [lowest, highest[split]]
+    vertex_polygons = [polygons, polygons[split]]
+    vertex_chains = [np.zeros(len(polygons), dtype=np.intp), np.ones(np.count_nonzero(split), dtype=np.intp)]
+
+    # Open edges 2k (lowest -> highest) and 2k + 1 (highest -> lowest) of the k-th polygon with two ends,
+    # each with the points outside it as candidates, sorted by edge
+    ends = np.full(len(polygons), -1, dtype=np.intp)
+    ends[split] = np.arange(np.count_nonzero(split))
+    edge_starts = np.column_stack((lowest[split], highest[split])).ravel()
+    edge_ends = np.column_stack((highest[split], lowest[split])).ravel()
+    edge_polygons = np.repeat(polygons[split], 2)
+    edge_chains = np.tile([0, 1], np.count_nonzero(split))
+    candidates = np.flatnonzero(split[polygon_ids])
+    edges = 2 * ends[polygon_ids[candidates]]
+    start, end = edge_starts[edges], edge_ends[edges]
+    x, y = xs[candidates], ys[candidates]
+    distances = _outside(xs[start], ys[start], xs[end], ys[end], x, y)
+    outside = distances != 0
+    edges = (edges + (distances < 0))[outside]
+    order = np.argsort(edges, kind='stable')
+    candidates, x, y, edges = candidates[outside][order], x[outside][order], y[outside][order], edges[order]
+    distances = np.abs(distances[outside][order])
+
+    while len(candidates):
+        boundaries = np.flatnonzero(edges[1:] != edges[:-1]) + 1
+        group_starts = np.concatenate(([0], boundaries))
+        group_ids = np.zeros(len(edges), dtype=np.intp)
+        group_ids[boundaries] = 1
+        np.cumsum(group_ids, out=group_ids)
+        open_edges = edges[group_starts]
+        start, end = edge_starts[open_edges], edge_ends[open_edges]
+        start_x, start_y = xs[start][group_ids], ys[start][group_ids]
+        end_x, end_y = xs[end][group_ids], ys[end][group_ids]
+
+        # The farthest point of each edge is a hull vertex. Of equally far points the one nearest the
+        # edge's start is taken, an end of their line and never a point in the middle of a hull edge
+        maxima = np.maximum.reduceat(distances, group_starts)
+        along = (x - start_x) * (end_x - start_x) + (y - start_y) * (end_y - start_y)
+        positions, _ = _first_max_positions(
+            np.where(distances == maxima[group_ids], -along, -np.inf), group_starts, group_ids
+        )
+        farthest = candidates[positions]
+        vertices.append(farthest)
+        vertex_polygons.append(edge_polygons[open_edges])
+        vertex_chains.append(edge_chains[open_edges])
+
+        # Edge k becomes 2k (start -> farthest) and 2k + 1 (farthest -> end), points inside the triangle drop out
+        apex_x, apex_y = x[positions][group_ids], y[positions][group_ids]
+        to_apex = _outside(start_x, start_y, apex_x, apex_y, x, y)
+        from_apex = _outside(apex_x, apex_y, end_x, end_y, x, y)
+        left = to_apex > 0
+        outside = left | (from_apex > 0)
+        edges = (2 * group_ids + ~left)[outside]
+        order = np.argsort(edges, kind='stable')
+        candidates, x, y, edges = candidates[outside][order], x[outside][order], y[outside][order], edges[order]
+        distances = np.where(left, to_apex, from_apex)[outside][order]
+        edge_starts = np.column_stack((start, farthest)).ravel()
+        edge_ends = np.column_stack((farthest, end)).ravel()
+        edge_polygons = np.repeat(edge_polygons[open_edges], 2)
+        edge_chains = np.repeat(edge_chains[open_edges], 2)
+
+    # Along the bottom chain the hull points increase in x, along the top one they decrease. No two
+    # vertices of one chain share an x, so sorting by x within (polygon, chain) orders every hull
+    vertices = np.concatenate(vertices)
+    vertex_polygons = np.concatenate(vertex_polygons)
+    vertex_chains = np.concatenate(vertex_chains)
+    order = np.argsort((1 - 2 * vertex_chains) * xs[vertices], kind='stable')
+    order = order[np.argsort((2 * vertex_polygons + vertex_chains)[order], kind='stable')]
+    hull_counts = np.bincount(vertex_polygons, minlength=len(counts))
+    return points[vertices[order]], polygon_offsets(hull_counts)
+
+
+def min_area_rectangles(points, offsets):
+    # Minimum-area enclosing rectangle of every packed polygon as (P, 4, 2) corners.
+    # The optimal rectangle has a side on a convex hull edge. Rotating calipers for all hulls at once:
+    # the unwrapped edge angles of a convex hull increase, so the vertex extreme in any direction is
+    # found by a binary search on them, for every edge's 3 calipers in one searchsorted call
+    hull, hull_offsets = convex_hulls(points, offsets)
+    hull_counts = np.diff(hull_offsets)
+    polygon_ids = np.repeat(np.arange(len(hull_counts)), hull_counts)
+    first = hull_offsets[:-1][polygon_ids]
+
+    # Edge i of a hull runs from its point i to point i + 1, wrapping around. Hulls of one point get
+    # a unit edge, so they still yield a (zero size) rectangle
+    following = np.arange(len(hull)) + 1
+    following[hull_offsets[1:][hull_counts > 0] - 1] = hull_offsets[:-1][hull_counts > 0]
+    edges = hull[following] - hull
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    directions = np.where(lengths[:, None] > 0, edges / np.where(lengths > 0, lengths, 1.0)[:, None], [1.0, 0.0])
+    normals = np.column_stack((-directions[:, 1], directions[:, 0]))
+
+    # Edge angles relative to each hull's first edge, unwrapped: every turn of a counter-clockwise hull
+    # is in [0, pi] and they add up to a full circle
+    previous = np.arange(len(hull)) - 1
+    previous[hull_offsets[:-1][hull_counts > 0]] = -1
+    turns = np.abs(np.arctan2(
+        directions[previous, 0] * directions[:, 1] - directions[previous, 1] * directions[:, 0],
+        np.einsum('ij,ij->i', directions[previous], directions),
+    ))
+    turns[previous < 0] = 0.0
+    angles = np.cumsum(turns)
+    angles -= angles[first]
+
+    # The vertex farthest in the direction at angle a is where the edge angles pass a + pi/2. The search
+    # runs in one sorted table of all hulls, each going round twice and shifted past the previous one
+    shift = polygon_ids * (4 * np.pi + 1.0)
+    table = np.empty(2 * len(hull))
+    table[first + np.arange(len(hull))] = angles + shift
+    table[first + hull_counts[polygon_ids] + np.arange(len(hull))] = angles + 2 * np.pi + shift
+    calipers = angles[:, None] + [0.5 * np.pi, np.pi, 1.5 * np.pi] + shift[:, None]
+    found = np.searchsorted(table, calipers) - 2 * first[:, None]
+    extremes = first[:, None] + found % hull_counts[polygon_ids][:, None]
+
+    along_max = np.einsum('ij,ij->i', hull[extremes[:, 0]], directions)
+    across_max = np.einsum('ij,ij->i', hull[extremes[:, 1]], normals)
+    along_min = np.einsum('ij,ij->i', hull[extremes[:, 2]], directions)
+    across_min = np.einsum('ij,ij->i', hull, normals)
+    areas = (along_max - along_min) * (across_max - across_min)
+
+    # Best edge of every polygon, the first one on ties
+    best_area = np.minimum.reduceat(areas, hull_offsets[:-1])
+    candidates = np.flatnonzero(areas == best_area[polygon_ids])
+    _, first = np.unique(polygon_ids[candidates], return_index=True)
+    best = candidates[first]
+
+    u, v = directions[best], normals[best]
+    corners = np.stack((
+        u * along_min[best, None] + v * across_min[best, None],
+        u * along_max[best, None] + v * across_min[best, None],
+        u * along_max[best, None] + v * across_max[best, None],
+        u * along_min[best, None] + v * across_max[best, None],
+    ), axis=1)
+    return corners
+
+
+def gather_polygons(points, offsets, polygon_ids):
+    # Packed copy of the given polygons, in that order (a polygon may repeat)
+    counts = np.diff(offsets)[polygon_ids]
+    gathered_offsets = polygon_offsets(counts)
+    indices = (
+        np.arange(gathered_offsets[-1]) - np.repeat(gathered_offsets[:-1], counts)
+        + np.repeat(offsets[:-1][polygon_ids], counts)
+    )
+    return points[indices], gathered_offsets
+
+
+def _closest_pair(a, b):
+    # Indices of the closest points of two (N, 2) arrays, compared in blocks of rows to bound memory
+    step = max(1, CLOSEST_PAIR_BLOCK // len(b))
+    best = (np.inf, 0, 0)
+    for start in range(0, len(a), step):
+        distances = ((a[start:start + step, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+        i, j = np.unravel_index(int(distances.argmin()), distances.shape)
+        if distances[i, j] < best[0]:
+            best = (distances[i, j], start + int(i), int(j))
+    return best[1], best[2]
+
+
+def merge_parts(parts):
+    # One (N, 2) outline for an object drawn as several polygons, like Ultralytics' merge_multi_segment:
+    # consecutive parts are linked at their closest points and the walk comes back over the same links,
+    # so the joins have no width and no edge crosses between the parts. The points are those of the
+    # parts (link points twice), so bounding boxes and hulls are the same as for all points together
+    parts = [np.asarray(part, dtype=np.float64).reshape(-1, 2) for part in parts]
+    parts = [part for part in parts if len(part)]
+    if len(parts) < 2:
+        return parts[0] if parts else np.zeros((0, 2))
+    links = [_closest_pair(a, b) for a, b in zip(parts, parts[1:])]
+    forward, backward = [], []
+    for i, part in enumerate(parts):
+        if i == 0 or i == len(parts) - 1:
+            # The first and last parts are walked all the way round, from their link back to it
+            start = links[0][0] if i == 0 else links[-1][1]
+            rolled = np.roll(part, -start, axis=0)
+            forward.append(np.concatenate([rolled, rolled[:1]]))
+            continue
+        # A middle part is walked from its previous link to its next one, the rest on the way back
+        enter, leave = links[i - 1][1], links[i][0]
+        rolled = np.roll(part, -enter, axis=0)
+        split = (leave - enter) % len(part)
+        forward.append(rolled[:split + 1])
+        backward.append(np.concatenate([rolled[split:], rolled[:1]]))
+    return np.concatenate(forward + backward[::-1])
+
+
+def polygon_areas(points, offsets):
+    # Area of every packed polygon (shoelace formula), 0 for polygons under 3 points
+    counts = np.diff(offsets)
+    polygon_ids = np.repeat(np.arange(len(counts)), counts)
+    following = np.arange(len(points)) + 1
+    following[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+    cross = points[:, 0] * points[following, 1] - points[following, 0] * points[:, 1]
+    return np.abs(np.bincount(polygon_ids, weights=cross, minlength=len(counts))) / 2.0
+
+
+def _clip_half_plane(points, offsets, bounds, axis, keep_above):
+    # One Sutherland-Hodgman pass over every packed polygon: keep the side of the line
+    # points[:, axis] == bound (one bound per polygon) given by keep_above
+    counts = np.diff(offsets)
+    polygon_ids = np.repeat(np.arange(len(counts)), counts)
+    bound = bounds[polygon_ids]
+    following = np.arange(len(points)) + 1
+    following[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+
+    side = points[:, axis] - bound
+    inside = side >= 0 if keep_above else side <= 0
+    inside_next = inside[following]
+    crossing = inside != inside_next
+    step = points[following] - points
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(crossing, -side / step[:, axis], 0.0)
+    intersections = points + t[:, None] * step
+    intersections[crossing, axis] = bound[crossing]
+
+    # Every edge emits its intersection with the line if it crosses it, then its end point if that is inside
+    emitted = np.column_stack((crossing, inside_next))
+    clipped = np.stack((intersections, points[following]), axis=1)[emitted]
+    clipped_counts = np.bincount(polygon_ids, weights=emitted.sum(axis=1), minlength=len(counts)).astype(np.intp)
+    return clipped, polygon_offsets(clipped_counts)
+
+
+def clip_polygons_to_boxes(points, offsets, boxes):
+    # Every packed polygon clipped to its own (x_min, y_min, x_max, y_max) box, in four batched passes.
+    # Polygons entirely outside their box come back without points
+    for axis, column, keep_above in ((0, 0, True), (0, 2, False), (1, 1, True), (1, 3, False)):
+        points, offsets = _clip_half_plane(points, offsets, boxes[:, column], axis, keep_above)
+
+    # Corners on the box edges are emitted twice, drop points equal to the previous one (and a last equal to the first)
+    counts = np.diff(offsets)
+    repeated = np.zeros(len(points), dtype=bool)
+    repeated[1:] = (points[1:] == points[:-1]).all(axis=1)
+    repeated[offsets[:-1][counts > 0]] = False
+    closing = offsets[1:][counts > 1] - 1
+    repeated[closing] |= (points[closing] == points[offsets[:-1][counts > 1]]).all(axis=1)
+    kept_counts = np.bincount(np.repeat(np.arange(len(counts)), counts)[~repeated], minlength=len(counts))
+    return points[~repeated], polygon_offsets(kept_counts)
@@ -1,10 +1,16 @@
 # GUI for Any2YOLO
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import queue
+import threading
+import time
 from PIL import Image, ImageTk
-from converter import JSONToTXTConverter
+from converter import JSONToTXTConverter, ConversionSummary
+from annotations import AnnotationCache
+from labelindex import LabelIndex, DEFAULT_INDEX_FILE
 from logger import log_action
 import webbrowser
+from collections import Counter
 
 
 class Any2YOLOApp:
@@ -23,6 +29,15 @@ class Any2YOLOApp:
         self.selected_labels = []
         self.available_labels = []
         self.file_label_map = {}
+        self.label_counts = Counter()  # Files per label, shown in the label panel
+        self.annotation_cache = AnnotationCache()  # Parsed files reused between uploads and conversion
+        self.label_index = self._open_label_index()  # Labels of files seen in earlier sessions
+
+        # Background work, the Tk loop polls task_queue for progress and results
+        self.task_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+        self.task_started = 0.0
 
         # GUI elements
         self.global_label_frame = None  # Frame for label controls
@@ -37,6 +52,14 @@ class Any2YOLOApp:
     def run(self):
         self.root.mainloop()
 
+    def _open_label_index(self):
+        # Without a usable index (e.g. read-only home folder) labels are extracted by parsing every file
+        try:
+            return LabelIndex(DEFAULT_INDEX_FILE)
+        except Exception as e:
+            log_action("Label index unavailable, labels will be read from every file: %s", "warning", e)
+            return None
+
     def _setup_styles(self):
         # Custom styles
         self.bg_color = "#F9FAFB"  # Light background
@@ -113,25 +136,36 @@ class Any2YOLOApp:
         # Placeholder for Delete All button
         self.delete_all_button = None
 
-        # Middle Section
+        # Middle Section: file list and label panel
+        # Treeviews only draw the visible rows, so tens of thousands of files stay responsive
         self.frame_middle = tk.Frame(self.root, bg=self.bg_color, pady=10)
         self.frame_middle.pack(fill=tk.BOTH, expand=True)
 
-        self.scroll_canvas = tk.Canvas(self.frame_middle, bg=self.bg_color, highlightthickness=0)
-        self.scroll_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        self.scrollable_frame = tk.Frame(self.scroll_canvas, bg=self.bg_color)
-        self.scrollable_frame.bind(
-            "<Configure>", lambda e: self.scroll_canvas.configure(scrollregion=self.scroll_canvas.bbox("all"))
-        )
-        self.scroll_canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-
-        self.scroll_canvas.bind("<MouseWheel>", self._on_mousewheel)
-
-        self.scrollbar = ttk.Scrollbar(self.frame_middle, orient="vertical", command=self.scroll_canvas.yview)
+        files_frame = tk.Frame(self.frame_middle, bg=self.bg_color)
+        files_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 5))
+        self.file_tree = ttk.Treeview(files_frame, columns=("labels",), selectmode="extended")
+        self.file_tree.heading("#0", text="File")
+        self.file_tree.heading("labels", text="Labels")
+        self.file_tree.column("#0", width=330)
+        self.file_tree.column("labels", width=150)
+        self.file_tree.bind("<Delete>", lambda e: self._remove_selected_files())
+        self.scrollbar = ttk.Scrollbar(files_frame, orient="vertical", command=self.file_tree.yview)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.scrollbar.pack_forget()
-        self.scroll_canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.file_tree.configure(yscrollcommand=self.scrollbar.set)
+        self.file_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        labels_frame = tk.Frame(self.frame_middle, bg=self.bg_color)
+        labels_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(5, 10))
+        self.label_tree = ttk.Treeview(labels_frame, columns=("files",), selectmode="none")
+        self.label_tree.heading("#0", text="Label (click to toggle)")
+        self.label_tree.heading("files", text="Files")
+        self.label_tree.column("#0", width=160)
+        self.label_tree.column("files", width=60, anchor="e")
+        self.label_tree.bind("<Button-1>", self._on_label_click)
+        label_scrollbar = ttk.Scrollbar(labels_frame, orient="vertical", command=self.label_tree.yview)
+        label_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.label_tree.configure(yscrollcommand=label_scrollbar.set)
+        self.label_tree.pack(side=tk.LEFT, fill=tk.Y)
 
         # Bottom Controls
         frame_bottom = tk.Frame(self.root, bg=self.bg_color, pady=10)
@@ -142,6 +176,27 @@ class Any2YOLOApp:
         )
         self.convert_button.pack_forget()
 
+        # Progress bar with live speed and a cancel button, shown while a task runs
+        self.progress_frame = tk.Frame(self.root, bg=self.bg_color, pady=5)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, orient="horizontal", mode="determinate", length=350)
+        self.progress_bar.pack(side=tk.LEFT, padx=10)
+        self.progress_label = tk.Label(self.progress_frame, text="", bg=self.bg_color, fg=self.text_color)
+        self.progress_label.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(
+            self.progress_frame,
+            text="Cancel",
+            font=("Arial", 9, "bold"),
+            bg="red",
+            fg="white",
+            activebackground="#CC0000",
+            activeforeground="white",
+            relief="flat",
+            command=self._cancel_task,
+            bd=0,
+            padx=5,
+        )
+        self.cancel_button.pack(side=tk.RIGHT, padx=10)
+
         self._update_global_label_controls()
 
 
@@ -173,10 +228,6 @@ class Any2YOLOApp:
             button.pack(pady=5, padx=10, ipadx=10, ipady=5, anchor="w")  # Default alignment
         return button
 
-    def _on_mousewheel(self, event):
-        # Handle mousewheel scrolling
-        self.scroll_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-
     def _setup_header(self):
         # Application header
         frame_top = tk.Frame(self.root, bg=self.header_color, pady=10)
@@ -227,17 +278,23 @@ class Any2YOLOApp:
         self.convert_button.pack_forget()
 
     def _upload_files(self):
-        new_files = filedialog.askopenfilenames(title="Select JSON Files", filetypes=[("JSON Files", "*.json")])
+        if self._is_busy():
+            return
+        new_files = filedialog.askopenfilenames(
+            title="Select Annotation Files",
+            filetypes=[("Annotation Files", "*.json *.xml"), ("JSON Files", "*.json"), ("Pascal VOC Files", "*.xml")],
+        )
         imported_files = []
+        known_files = set(self.input_files)
         for file in new_files:
-            if file not in self.input_files:
+            if file not in known_files:
+                known_files.add(file)
                 self.input_files.append(file)
                 imported_files.append(file)
-                log_action(f"Imported file: {file}", "info")
+                log_action("Imported file: %s", "info", file)
             if imported_files:
                 self.root.geometry("800x700")
-                self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-                log_action(f"Total {len(imported_files)} files successfully imported.", "info")
+                log_action("Total %d files successfully imported.", "info", len(imported_files))
             else:
                 log_action("No new files were imported.", "info")
         self._update_available_labels()
@@ -246,43 +303,6 @@ class Any2YOLOApp:
         self._update_delete_all_button() 
         
 
-    def _update_gui(self):
-        # Update GUI elements based on uploaded files
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        if self.input_files:
-            for file in self.input_files:
-                file_frame = tk.Frame(self.scrollable_frame, bg=self.bg_color, pady=5, padx=10)
-                file_frame.pack(fill=tk.X, pady=5)
-
-                # File label
-                tk.Label(
-                    file_frame, text=file, bg=self.bg_color, fg=self.text_color, anchor="w"
-                ).pack(side=tk.LEFT, expand=True)
-
-                # Remove file button
-                tk.Button(
-                    file_frame,
-                    text="✕",
-                    font=("Arial", 10, "bold"),
-                    bg="red",
-                    fg="white",
-                    command=lambda f=file: self._remove_file(f),
-                ).pack(side=tk.RIGHT)
-            self.convert_button.pack()  # Show Convert button
-            self._update_delete_all_button()
-        else:
-            self.convert_button.pack_forget()  # Hide Convert button
-            self._update_delete_all_button()
-
-    def _remove_file(self, file):
-        # Remove an individual file
-        if file in self.input_files:
-            self.input_files.remove(file)
-            log_action(f"Removed file: {file}", "warning")
-            self._update_gui()
-
     def _update_delete_all_button(self):
         # Show or hide the Delete All button
         if self.input_files:
@@ -317,7 +337,6 @@ class Any2YOLOApp:
             if self.delete_all_button:
                 self.delete_all_button.destroy()
                 self.root.geometry("600x400")
-                self.scrollbar.pack_forget()
                 self.delete_all_button = None
 
     def _update_convert_button(self):
@@ -330,13 +349,94 @@ class Any2YOLOApp:
                 self.convert_button.pack_forget()  # Hide the Convert button
 
     def _update_available_labels(self):
+        # Label extraction runs in the background, _on_labels_extracted shows the result
         if self.input_files:
-            converter = JSONToTXTConverter(self.input_files, self.selected_labels)
-            self.available_labels, self.file_label_map = converter.extract_labels()
+            converter = JSONToTXTConverter(
+                list(self.input_files), self.selected_labels, cache=self.annotation_cache, index=self.label_index
+            )
+            self._run_in_background("labels", converter.extract_labels)
+        else:
+            self.available_labels, self.file_label_map = [], {}
             self._update_file_label_mapping()
+
+    def _on_labels_extracted(self, result, cancelled):
+        self.available_labels, self.file_label_map = result
+        if cancelled:
+            log_action("Label extraction cancelled, showing %d files.", "warning", len(self.file_label_map))
+        self._update_file_label_mapping()
+
+    def _is_busy(self):
+        # Only one background task at a time, the file list must not change under it
+        if self.worker is not None and self.worker.is_alive():
+            messagebox.showinfo("Please wait", "A task is still running, wait for it or press Cancel.")
+            return True
+        return False
+
+    def _run_in_background(self, kind, task):
+        # Run task(progress=..., cancel=...) on a worker thread
+        self.cancel_event.clear()
+        self.task_started = time.perf_counter()
+        self.progress_bar["value"] = 0
+        self.progress_label.config(text="Starting...")
+        self.progress_frame.pack(fill=tk.X, before=self.frame_middle)
+
+        def progress(done, total):
+            self.task_queue.put(("progress", kind, (done, total)))
+
+        def work():
+            try:
+                result = task(progress=progress, cancel=self.cancel_event)
+                self.task_queue.put(("done", kind, result))
+            except Exception as e:
+                self.task_queue.put(("error", kind, e))
+
+        self.worker = threading.Thread(target=work, daemon=True)
+        self.worker.start()
+        self.root.after(100, self._poll_task_queue)
+
+    def _poll_task_queue(self):
+        # Drain worker messages on the Tk thread, only the latest progress is drawn
+        latest_progress = None
+        finished = None
+        while True:
+            try:
+                message = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                latest_progress = message[2]
+            else:
+                finished = message
+
+        if latest_progress is not None:
+            done, total = latest_progress
+            elapsed = max(time.perf_counter() - self.task_started, 1e-6)
+            self.progress_bar["maximum"] = total or max(done, 1)
+            self.progress_bar["value"] = done
+            self.progress_label.config(text=f"{done}/{total or '?'} files · {done / elapsed:.1f} files/s")
+
+        if finished is None:
+            self.root.after(100, self._poll_task_queue)
+            return
+
+        self.progress_frame.pack_forget()
+        status, kind, payload = finished
+        cancelled = self.cancel_event.is_set()
+        if status == "error":
+            error_message = f"An error occurred during {'conversion' if kind == 'convert' else 'label extraction'}: {payload}"
+            log_action(error_message, "error")
+            messagebox.showerror("Error", error_message)
+        elif kind == "labels":
+            self._on_labels_extracted(payload, cancelled)
         else:
-            for widget in self.scrollable_frame.winfo_children():
-                widget.destroy()
+            self._on_conversion_finished(payload, cancelled)
+
+    def _cancel_task(self):
+        # Stops the running task at the next file boundary
+        if self.worker is not None and self.worker.is_alive():
+            self.cancel_event.set()
+            self.progress_label.config(text="Cancelling...")
+            log_action("Cancellation requested.", "warning")
 
     def _update_global_label_controls(self):
         # Update the global label selection controls 
@@ -358,6 +458,9 @@ class Any2YOLOApp:
             self._create_button(
                 self.global_label_frame, "🚫 Deselect All", self._deselect_all_labels, smaller=True
             ).pack(side=tk.LEFT, padx=2, pady=2)
+            self._create_button(
+                self.global_label_frame, "✕ Remove Selected", self._remove_selected_files, smaller=True
+            ).pack(side=tk.LEFT, padx=2, pady=2)
 
             if self.convert_button:
                 self.convert_button.pack(side=tk.TOP, pady=10)
@@ -375,6 +478,8 @@ class Any2YOLOApp:
 
     def _clear_all_files(self):
         # Clear all uploaded files
+        if self._is_busy():
+            return
         self.input_files.clear()
         log_action("All files removed.", "warning")
         self._update_available_labels()
@@ -387,107 +492,119 @@ class Any2YOLOApp:
         # Select all labels globally
         self.selected_labels = self.available_labels.copy()
         log_action("All labels selected globally.", "info")
-        self._update_file_label_mapping()
+        self._refresh_label_panel()
 
     def _deselect_all_labels(self):
         # Deselect all labels globally
         self.selected_labels.clear()
         log_action("All labels deselected globally.", "info")
-        self._update_file_label_mapping()
+        self._refresh_label_panel()
 
     def _update_file_label_mapping(self):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+        # Sync the file list with file_label_map, only changed rows touch Tk
+        current_rows = set(self.file_tree.get_children())
+        stale_rows = current_rows.difference(self.file_label_map)
+        if stale_rows:
+            self.file_tree.delete(*stale_rows)
 
         for file, labels in self.file_label_map.items():
-            file_frame = tk.Frame(self.scrollable_frame, bg=self.bg_color, pady=5, padx=10)
-            file_frame.pack(fill=tk.X, pady=5)
-
-            # File Name and X Button
-            file_header = tk.Frame(file_frame, bg=self.bg_color)
-            file_header.pack(fill=tk.X)
-            tk.Label(
-                file_header, text=f"File: {file}", font=("Arial", 12, "bold"), bg=self.bg_color, fg=self.text_color
-            ).pack(side=tk.LEFT, padx=10)
-
-            remove_btn = tk.Button(
-                file_header,
-                text="✕",
-                font=("Arial", 12, "bold"),
-                bg="red",
-                fg="white",
-                activebackground="#CC0000",
-                activeforeground="white",
-                relief="flat",
-                command=lambda f=file: self._remove_file(f),
-                bd=0,
-                highlightthickness=0,
-                padx=5,
+            labels_text = ", ".join(labels)
+            if file not in current_rows:
+                self.file_tree.insert("", tk.END, iid=file, text=file, values=(labels_text,))
+            elif self.file_tree.set(file, "labels") != labels_text:
+                self.file_tree.set(file, "labels", labels_text)
+
+        self.label_counts = Counter(label for labels in self.file_label_map.values() for label in labels)
+        self._refresh_label_panel()
+
+    def _refresh_label_panel(self):
+        # One row per label with its file count, cost depends on the number of labels only
+        self.label_tree.delete(*self.label_tree.get_children())
+        for label in sorted(self.label_counts):
+            self.label_tree.insert(
+                "", tk.END, iid=label, text=self._label_row_text(label), values=(self.label_counts[label],)
             )
-            remove_btn.pack(side=tk.RIGHT, padx=5)
 
-            # Labels with Checkboxes
-            labels_frame = tk.Frame(file_frame, bg=self.bg_color, pady=5)
-            labels_frame.pack(fill=tk.X)
+    def _label_row_text(self, label):
+        return f"{'☑' if label in self.selected_labels else '☐'} {label}"
 
-            tk.Label(labels_frame, text="Labels:", font=("Arial", 12, "bold"), bg=self.bg_color, fg=self.text_color).pack(
-                anchor="w", pady=2
-            )
+    def _on_label_click(self, event):
+        label = self.label_tree.identify_row(event.y)
+        if label:
+            self._toggle_label_selection(label)
 
-            for label in labels:
-                chk_var = tk.IntVar(value=1 if label in self.selected_labels else 0)
-                chk_btn = tk.Checkbutton(
-                    labels_frame,
-                    text=label,
-                    variable=chk_var,
-                    bg=self.bg_color,
-                    fg=self.text_color,
-                    activebackground=self.bg_color,
-                    activeforeground=self.text_color,
-                    command=lambda l=label, v=chk_var: self._toggle_label_selection(l, v),
-                )
-                chk_btn.pack(anchor="w", padx=20)
-
-    def _toggle_label_selection(self, label, variable):
-        if variable.get():
-            if label not in self.selected_labels:
-                self.selected_labels.append(label)
+    def _toggle_label_selection(self, label):
+        selected = label not in self.selected_labels
+        if selected:
+            self.selected_labels.append(label)
+        else:
+            self.selected_labels.remove(label)
+        self.label_tree.item(label, text=self._label_row_text(label))
+        log_action("%s label: %s", "info", "Selected" if selected else "Deselected", label)
+
+    def _remove_selected_files(self):
+        selection = self.file_tree.selection()
+        if selection:
+            self._remove_files(selection)
+
+    def _remove_files(self, files):
+        # Drop files from the list, labels come from the known map so nothing is re-read
+        if self._is_busy():
+            return
+        removed = set(files).intersection(self.input_files)
+        if not removed:
+            return
+        self.input_files[:] = [file for file in self.input_files if file not in removed]
+        for file in removed:
+            self.file_label_map.pop(file, None)
+        if len(removed) == 1:
+            log_action("Removed file: %s", "warning", next(iter(removed)))
         else:
-            if label in self.selected_labels:
-                self.selected_labels.remove(label)
-        log_action(f"{'Selected' if variable.get() else 'Deselected'} label: {label}", "info")
-
-    def _remove_file(self, file):
-        if file in self.input_files:
-            self.input_files.remove(file)
-            log_action(f"Removed file: {file}", "warning")
-            self._update_available_labels()
-            self._update_global_label_controls()
-            self._update_delete_all_button()
+            log_action("Removed %d files.", "warning", len(removed))
+
+        self._update_file_label_mapping()
+        self.available_labels = sorted(self.label_counts)
+        self._update_global_label_controls()
+        self._update_delete_all_button()
+        self._update_convert_button()
 
     def _start_conversion(self):
+        if self._is_busy():
+            return
         if not self.input_files or not self.selected_labels:
             messagebox.showerror("Error", "Please select files and labels before conversion.")
             return
 
-        log_action(f"Starting conversion with selected labels: {', '.join(self.selected_labels)}", "info")
-        try:
-            converter = JSONToTXTConverter(self.input_files, self.selected_labels)
-            results = converter.convert_files()
-            result_message = "\n".join([f"{file}: {result}" for file, result in results.items()])
-            log_action(f"Conversion results:\n{result_message}", "info")
-            messagebox.showinfo("Conversion Results", result_message)
-
-            # Clear inputs after successful conversion
-            self.input_files.clear()
-            for widget in self.scrollable_frame.winfo_children():
-                widget.destroy()
-            self._update_global_label_controls()
-            self._update_delete_all_button()
-        except Exception as e:
-            error_message = f"An error occurred during conversion: {e}"
-            log_action(error_message, "error")
-            messagebox.showerror("Error", error_message)
+        log_action("Starting conversion with selected labels: %s", "info", ", ".join(self.selected_labels))
+        # Only counters and a few errors are kept, not one result or validation issue per file
+        summary = ConversionSummary()
+        converter = JSONToTXTConverter(
+            list(self.input_files), list(self.selected_labels), cache=self.annotation_cache, on_issue=summary.add_issue
+        )
+
+        def convert(progress, cancel):
+            return summary.consume(converter.iter_results(progress, cancel))
+
+        self._run_in_background("convert", convert)
+
+    def _on_conversion_finished(self, summary, cancelled):
+        result_message = summary.message()
+        log_action("Conversion results:\n%s", "info", result_message)
+        if cancelled:
+            # Keep the inputs so the conversion can be restarted
+            messagebox.showwarning(
+                "Conversion Cancelled",
+                f"Cancelled after {summary.total} of {len(self.input_files)} files.\n\n{result_message}",
+            )
+            return
+        messagebox.showinfo("Conversion Results", result_message)
+
+        # Clear inputs after successful conversion
+        self.input_files.clear()
+        self.file_label_map = {}
+        self._update_file_label_mapping()
+        self._update_global_label_controls()
+        self._update_delete_all_button()
 
     def _view_logs(self):
         log_window = tk.Toplevel(self.root)
@@ -586,10 +703,10 @@ class Any2YOLOApp:
             "   - Select the JSON files you want to process\n\n"
             "2. Manage Files:\n"
             "   - Review the uploaded files in the middle section\n"
-            "   - Use the delete button next to a file to remove it\n"
+            "   - Select files and press Delete or 'Remove Selected' to remove them\n"
             "   - Use 'Delete All' to clear all uploaded files\n\n"
             "3. Select Labels:\n"
-            "   - Choose labels globally or per file\n"
+            "   - Click a label in the label panel to toggle it, the panel shows how many files use it\n"
             "   - Use 'Select All' or 'Deselect All' to manage global labels\n\n"
             "4. Convert Files:\n"
             "   - Click the 'Convert' button to process the files\n"
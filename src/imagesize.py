@@ -0,0 +1,144 @@
+# Image dimensions read from file headers
+
+# Used when an annotation lacks imageWidth/imageHeight, or to check them.
+# Only the header is read (a few hundred bytes, JPEG segments are skipped with seek),
+# images are never decoded. Supports PNG, JPEG, GIF, BMP, WebP and TIFF
+import os
+import struct
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger("Any2YOLO.imagesize")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".gif")
+HEADER_SIZE = 32
+# JPEG start-of-frame markers, they hold the dimensions (C4, C8 and CC are other segments)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, *range(0xD0, 0xD8)}
+
+
+def find_image(file_path, data):
+    # The image of an annotation: its imagePath relative to the JSON, the same file name next to the JSON,
+    # or an image with the JSON's name. None if there is none
+    json_dir = os.path.dirname(file_path)
+    candidates = []
+    if data.get('imagePath'):
+        # AnyLabeling on Windows stores backslash separated paths
+        image_path = data['imagePath'].replace("\\", "/")
+        candidates.append(os.path.join(json_dir, image_path))
+        candidates.append(os.path.join(json_dir, os.path.basename(image_path)))
+    stem = os.path.splitext(file_path)[0]
+    candidates += [stem + extension for extension in IMAGE_EXTENSIONS]
+    candidates += [stem + extension.upper() for extension in IMAGE_EXTENSIONS]
+
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':  # Fill bytes before the marker
+            byte = f.read(1)
+        if not byte:
+            raise ValueError("no JPEG frame header found")
+        marker = byte[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9:
+            raise ValueError("no JPEG frame header found")
+        length = struct.unpack(">H", f.read(2))[0]
+        if length < 2:
+            raise ValueError(f"invalid JPEG segment length {length}")
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _tiff_size(f, header):
+    endian = "<" if header[:2] == b'II' else ">"
+    f.seek(struct.unpack(endian + "I", header[4:8])[0])
+    (count,) = struct.unpack(endian + "H", f.read(2))
+    size = {}
+    for _ in range(count):
+        tag, field_type, _, value = struct.unpack(endian + "HHI4s", f.read(12))
+        if tag in (256, 257):
+            if field_type == 3:  # SHORT, stored in the first two bytes of the value field
+                size[tag] = struct.unpack(endian + "H", value[:2])[0]
+            else:
+                size[tag] = struct.unpack(endian + "I", value)[0]
+            if len(size) == 2:
+                return size[256], size[257]
+    raise ValueError("no TIFF dimensions found")
+
+
+def probe_image_size(image_path):
+    # (width, height) of an image from its header, ValueError for unknown, broken or truncated files
+    try:
+        return _probe(image_path)
+    except struct.error:
+        # A header field cut off by the end of the file
+        raise ValueError(f"truncated image header: {image_path}")
+
+
+def _probe(image_path):
+    with open(image_path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        if header.startswith(b'\x89PNG\r\n\x1a\n') and header[12:16] == b'IHDR':
+            return struct.unpack(">II", header[16:24])
+        if header.startswith(b'\xff\xd8'):
+            return _jpeg_size(f)
+        if header[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack("<HH", header[6:10])
+        if header.startswith(b'BM'):
+            if struct.unpack("<I", header[14:18])[0] == 12:  # OS/2 bitmap header
+                return struct.unpack("<HH", header[18:22])
+            width, height = struct.unpack("<ii", header[18:26])
+            return width, abs(height)  # Negative for top-down bitmaps
+        if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+            chunk = header[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack("<HH", header[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                bits = int.from_bytes(header[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(header[24:27], 'little') + 1, int.from_bytes(header[27:30], 'little') + 1
+        if header[:4] in (b'II*\x00', b'MM\x00*'):
+            return _tiff_size(f, header)
+    raise ValueError(f"unsupported image format: {image_path}")
+
+
+class ImageSizeCache:
+    # LRU cache of probed image sizes keyed by path, mtime and size
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # path -> ((mtime_ns, size), (width, height))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, image_path):
+        stat = os.stat(image_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(image_path)
+        if entry is not None and entry[0] == key:
+            self._entries.move_to_end(image_path)
+            return entry[1]
+
+        size = tuple(probe_image_size(image_path))
+        logger.debug("Probed %s: %sx%s", image_path, *size)
+        self._entries[image_path] = (key, size)
+        self._entries.move_to_end(image_path)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return size
@@ -0,0 +1,165 @@
+# Per-stage timing and throughput counters for conversion runs
+
+# A RunStats collects, across extract_labels and convert_files:
+# - time spent reading, parsing, computing and writing
+# - bytes read, files and shapes processed, failures
+# - the slowest files, to spot outliers
+# and writes a structured report as JSON or Prometheus text format
+import json
+import heapq
+import time
+from contextlib import contextmanager
+
+STAGES = ("read", "parse", "compute", "write")
+
+
+class TimedReader:
+    # File wrapper that adds read() time and bytes to a RunStats
+
+    def __init__(self, f, stats):
+        self._f = f
+        self._stats = stats
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self._f.read(size)
+        self._stats.add("read", time.perf_counter() - start)
+        self._stats.bytes_read += len(data)
+        return data
+
+    def seek(self, *args):
+        return self._f.seek(*args)
+
+
+class RunStats:
+    # Counters for one run, merged from worker processes in parallel mode
+
+    def __init__(self, slowest=10):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.extract_seconds = 0.0
+        self.convert_seconds = 0.0
+        self.bytes_read = 0
+        self.files = 0
+        self.failed = 0
+        self.shapes = 0
+        self.cache_hits = 0
+        self.size_mismatches = 0  # Files whose imageWidth/imageHeight disagree with the image
+        self.dedup_hits = 0  # Files whose output was reused from an identical payload
+        # Polygon vertices going into and out of simplification
+        self.vertices_before_simplify = 0
+        self.vertices_after_simplify = 0
+        self.slowest = slowest
+        self._slowest_files = []  # Min-heap of (seconds, path), bounded to `slowest` entries
+
+    def add(self, stage, seconds):
+        self.seconds[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+    def file_done(self, file_path, seconds, failed=False):
+        self.files += 1
+        if failed:
+            self.failed += 1
+        self._track_slowest(seconds, file_path)
+
+    def _track_slowest(self, seconds, file_path):
+        if len(self._slowest_files) < self.slowest:
+            heapq.heappush(self._slowest_files, (seconds, file_path))
+        elif seconds > self._slowest_files[0][0]:
+            heapq.heapreplace(self._slowest_files, (seconds, file_path))
+
+    def to_dict(self):
+        # Plain counters, picklable and JSON friendly
+        return {
+            "seconds": dict(self.seconds),
+            "extract_seconds": self.extract_seconds,
+            "convert_seconds": self.convert_seconds,
+            "bytes_read": self.bytes_read,
+            "files": self.files,
+            "failed": self.failed,
+            "shapes": self.shapes,
+            "cache_hits": self.cache_hits,
+            "size_mismatches": self.size_mismatches,
+            "dedup_hits": self.dedup_hits,
+            "vertices_before_simplify": self.vertices_before_simplify,
+            "vertices_after_simplify": self.vertices_after_simplify,
+            "slowest_files": sorted(self._slowest_files, reverse=True),
+        }
+
+    def merge(self, counters):
+        # Add the counters of another RunStats (e.g. from a worker process)
+        for stage, seconds in counters["seconds"].items():
+            self.seconds[stage] += seconds
+        self.bytes_read += counters["bytes_read"]
+        self.files += counters["files"]
+        self.failed += counters["failed"]
+        self.shapes += counters["shapes"]
+        self.cache_hits += counters["cache_hits"]
+        self.size_mismatches += counters["size_mismatches"]
+        self.dedup_hits += counters["dedup_hits"]
+        self.vertices_before_simplify += counters["vertices_before_simplify"]
+        self.vertices_after_simplify += counters["vertices_after_simplify"]
+        for seconds, file_path in counters["slowest_files"]:
+            self._track_slowest(seconds, file_path)
+
+    def report(self):
+        # Structured end-of-run report
+        wall = self.convert_seconds or sum(self.seconds.values()) or 1e-9
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "shapes": self.shapes,
+            "bytes_read": self.bytes_read,
+            "cache_hits": self.cache_hits,
+            "size_mismatches": self.size_mismatches,
+            "dedup_hits": self.dedup_hits,
+            "vertices_before_simplify": self.vertices_before_simplify,
+            "vertices_after_simplify": self.vertices_after_simplify,
+            "extract_labels_seconds": round(self.extract_seconds, 6),
+            "convert_files_seconds": round(self.convert_seconds, 6),
+            "stage_seconds": {stage: round(seconds, 6) for stage, seconds in self.seconds.items()},
+            "files_per_sec": round(self.files / wall, 2),
+            "shapes_per_sec": round(self.shapes / wall, 2),
+            "read_mb_per_sec": round(self.bytes_read / self.seconds["read"] / 1e6, 2) if self.seconds["read"] else None,
+            "slowest_files": [
+                {"file": file_path, "seconds": round(seconds, 6)}
+                for seconds, file_path in sorted(self._slowest_files, reverse=True)
+            ],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_prometheus(self, path):
+        # Prometheus text exposition format, e.g. for the node_exporter textfile collector
+        report = self.report()
+        lines = [
+            "# HELP any2yolo_stage_seconds Time spent per conversion stage.",
+            "# TYPE any2yolo_stage_seconds gauge",
+        ]
+        lines += [f'any2yolo_stage_seconds{{stage="{stage}"}} {seconds}' for stage, seconds in self.seconds.items()]
+        for name, value, help_text in (
+            ("files", report["files"], "Files processed."),
+            ("failed_files", report["failed"], "Files that failed to convert."),
+            ("shapes", report["shapes"], "Shapes written."),
+            ("bytes_read", report["bytes_read"], "Annotation bytes read."),
+            ("cache_hits", report["cache_hits"], "Files served from the annotation cache."),
+            ("size_mismatches", report["size_mismatches"], "Files whose stored image size disagrees with the image."),
+            ("dedup_hits", report["dedup_hits"], "Files whose output was reused from an identical payload."),
+            ("vertices_before_simplify", report["vertices_before_simplify"], "Polygon vertices before simplification."),
+            ("vertices_after_simplify", report["vertices_after_simplify"], "Polygon vertices after simplification."),
+            ("extract_labels_seconds", report["extract_labels_seconds"], "Wall time of label extraction."),
+            ("convert_files_seconds", report["convert_files_seconds"], "Wall time of conversion."),
+        ):
+            lines.append(f"# HELP any2yolo_{name} {help_text}")
+            lines.append(f"# TYPE any2yolo_{name} gauge")
+            lines.append(f"any2yolo_{name} {value}")
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,212 @@
+# Selective JSON reader for AnyLabeling files
+
+# AnyLabeling embeds the whole image as a base64 "imageData" string, often many MB,
+# while the converter only needs shapes and the image size. The reader streams the file
+# in chunks, drops every imageData string value without ever holding it in memory and
+# decodes the remaining (small) document with the fastest available backend.
+# Unusual files fall back to the full parser.
+# iter_members streams huge single-document files (COCO) element by element
+import re
+import json
+import logging
+from instrumentation import TimedReader
+from decoders import decode, decode_annotation
+
+logger = logging.getLogger("Any2YOLO.jsonreader")
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# A key is a string followed by ':'. An unescaped quote followed by imageData" and ':' can
+# only open a key, never sit inside a string value, so the pattern cannot misfire
+SKIPPED_VALUE = re.compile(rb'"imageData"\s{0,64}:\s{0,64}"')
+# Bytes kept between chunks so a key split across two reads is still found
+CARRY_SIZE = 160
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_json_decoder = json.JSONDecoder()
+
+
+def _is_escaped(output, buffer, index):
+    # True when the quote at buffer[index] is preceded by an odd number of backslashes,
+    # counting into the already flushed output when the run reaches the buffer start
+    backslashes = 0
+    while index > 0 and buffer[index - 1] == 0x5C:
+        backslashes += 1
+        index -= 1
+    if index == 0:
+        position = len(output)
+        while position > 0 and output[position - 1] == 0x5C:
+            backslashes += 1
+            position -= 1
+    return backslashes % 2 == 1
+
+
+class _StringSkipper:
+    # Consumes a JSON string value across chunks until its closing quote
+
+    def __init__(self):
+        self.trailing_backslashes = 0  # Backslashes at the end of the previous chunk
+
+    def feed(self, data, start=0):
+        # Index just past the closing quote in data, or None if the string continues
+        position = start
+        while True:
+            quote = data.find(b'"', position)
+            if quote < 0:
+                tail = data[start:]
+                stripped = tail.rstrip(b'\\')
+                run = len(tail) - len(stripped)
+                self.trailing_backslashes = run if stripped else self.trailing_backslashes + run
+                return None
+
+            backslashes = 0
+            index = quote
+            while index > start and data[index - 1] == 0x5C:
+                backslashes += 1
+                index -= 1
+            if index == start:
+                backslashes += self.trailing_backslashes
+            if backslashes % 2 == 0:
+                return quote + 1
+            position = quote + 1
+
+
+def read_slim(f, chunk_size=READ_CHUNK_SIZE):
+    # Bytes of the JSON document with every imageData string replaced by null
+    output = bytearray()
+    buffer = b''
+    skipper = None
+
+    while True:
+        chunk = f.read(chunk_size)
+        if skipper is not None:
+            end = skipper.feed(chunk)
+            if end is None:
+                if not chunk:
+                    raise ValueError("Unterminated imageData string")
+                continue
+            buffer = chunk[end:]
+            skipper = None
+        else:
+            buffer += chunk
+
+        # Drop any imageData values fully or partially in the buffer
+        search_from = 0
+        while True:
+            match = SKIPPED_VALUE.search(buffer, search_from)
+            if match is None:
+                break
+            if _is_escaped(output, buffer, match.start()):
+                search_from = match.start() + 1
+                continue
+            output += buffer[:match.end() - 1]
+            output += b'null'
+            skipper = _StringSkipper()
+            end = skipper.feed(buffer, match.end())
+            if end is None:
+                buffer = b''
+                break
+            buffer = buffer[end:]
+            skipper = None
+            search_from = 0
+
+        if not chunk:
+            output += buffer
+            return bytes(output)
+        if skipper is None and len(buffer) > CARRY_SIZE:
+            output += buffer[:-CARRY_SIZE]
+            buffer = buffer[-CARRY_SIZE:]
+
+
+def read_annotation(file_path, chunk_size=READ_CHUNK_SIZE, stats=None):
+    # Parse an AnyLabeling JSON without materializing its imageData
+    # An optional RunStats receives the time spent in read() and the bytes read
+    with open(file_path, 'rb') as raw_file:
+        f = TimedReader(raw_file, stats) if stats is not None else raw_file
+        try:
+            data = decode_annotation(read_slim(f, chunk_size))
+            if isinstance(data, dict):
+                return data
+        except ValueError as e:
+            logger.debug("Selective read failed for %s, using the full parser: %s", file_path, e)
+
+        f.seek(0)
+        return decode(f.read())
+
+
+class _TextStream:
+    # Buffered text reader decoding one JSON value at a time with the stdlib scanner
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        # Read one more chunk, dropping what was already consumed
+        if self.position:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+        return bool(chunk)
+
+    def peek(self):
+        # Next non-whitespace character, '' at the end of the file
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ''
+
+    def take(self, expected):
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f"Expected one of {expected!r}, found {char!r}")
+        self.position += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(self.buffer, self.position)
+                # A value ending with the buffer may be a cut number, read on to be sure
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_members(f, chunk_size=READ_CHUNK_SIZE):
+    # Stream the members of a top-level JSON object from a text file as (key, value) pairs.
+    # Arrays are not built: each of their elements is yielded as (key, element) instead,
+    # so a multi-GB COCO file is read with one element in memory at a time
+    stream = _TextStream(f, chunk_size)
+    stream.take('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.take(':')
+        if stream.peek() == '[':
+            stream.take('[')
+            if stream.peek() == ']':
+                stream.take(']')
+            else:
+                while True:
+                    yield key, stream.value()
+                    if stream.take(',]') == ']':
+                        break
+        else:
+            yield key, stream.value()
+        if stream.take(',}') == '}':
+            return
@@ -0,0 +1,220 @@
+# Persistent label index of annotation files
+
+# An SQLite database recording, per JSON file, its mtime, size, image size and
+# the number of shapes of every label. Files are only parsed again when their
+# mtime or size changed, so label discovery over an indexed corpus is a few queries
+# and files can be selected by the labels they contain
+import os
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from itertools import islice
+from annotations import load_annotation
+
+logger = logging.getLogger("Any2YOLO.labelindex")
+
+INDEX_VERSION = 1
+# Index used by the GUI, shared between sessions
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".any2yolo", "label_index.sqlite")
+# Rows looked up or written per statement, below SQLite's default variable limit
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    image_width NUMERIC,
+    image_height NUMERIC,
+    shape_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_labels (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    shape_count INTEGER NOT NULL,
+    PRIMARY KEY (path, label)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS file_labels_label ON file_labels(label, path);
+"""
+
+
+def _key(file_path):
+    # Files are stored by absolute path, so the index works from any working directory
+    return os.path.abspath(file_path)
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class LabelIndex:
+    # Label, shape count and image size per annotation file, refreshed by mtime and size
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # The GUI builds the index on its background thread, a lock serializes access instead
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA foreign_keys = ON")
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, INDEX_VERSION):
+                logger.warning("Rebuilding label index %s with unsupported version %s", path, version)
+                self._connection.executescript("DROP TABLE IF EXISTS file_labels; DROP TABLE IF EXISTS files;")
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def refresh(self, file_paths, load=load_annotation, progress=None, cancel=None):
+        # Bring the given files up to date, parsing only new or changed ones with load(file_path).
+        # Returns {file_path: error message} for files that could not be indexed
+        errors = {}
+        done = 0
+        total = len(file_paths) if isinstance(file_paths, list) else None
+        for batch in _batches(file_paths):
+            if cancel is not None and cancel.is_set():
+                logger.warning("Label index refresh cancelled")
+                break
+            known = self._stat_entries([_key(file_path) for file_path in batch])
+            rows, label_rows = [], []
+            for file_path in batch:
+                try:
+                    stat = os.stat(file_path)
+                    key = _key(file_path)
+                    if known.get(key) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    data = load(file_path)
+                    labels = Counter(shape['label'] for shape in data.get('shapes', []))
+                    rows.append((
+                        key, stat.st_mtime_ns, stat.st_size,
+                        data.get('imageWidth'), data.get('imageHeight'), sum(labels.values()),
+                    ))
+                    label_rows += [(key, label, count) for label, count in labels.items()]
+                except Exception as e:
+                    logger.error("Error indexing file %s: %s", file_path, e)
+                    errors[file_path] = str(e)
+            self._write(rows, label_rows)
+            done += len(batch)
+            if progress is not None:
+                progress(done, total)
+        return errors
+
+    def _stat_entries(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT path, mtime_ns, size FROM files WHERE path IN ({placeholders})", keys
+            )
+            return {path: (mtime_ns, size) for path, mtime_ns, size in cursor}
+
+    def _write(self, rows, label_rows):
+        if not rows:
+            return
+        with self._lock, self._connection:
+            # Replacing a file row cascades to its old labels
+            self._connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._connection.executemany("INSERT OR REPLACE INTO file_labels VALUES (?, ?, ?)", label_rows)
+        logger.debug("Indexed %s files", len(rows))
+
+    def prune(self):
+        # Drop files that no longer exist on disk, returns how many were removed
+        with self._lock:
+            paths = [row[0] for row in self._connection.execute("SELECT path FROM files")]
+        missing = [path for path in paths if not os.path.exists(path)]
+        with self._lock, self._connection:
+            for batch in _batches(missing):
+                placeholders = ",".join("?" * len(batch))
+                self._connection.execute(f"DELETE FROM files WHERE path IN ({placeholders})", batch)
+        if missing:
+            logger.info("Removed %s deleted files from the label index", len(missing))
+        return len(missing)
+
+    def labels(self):
+        # Every label of the indexed files, sorted
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT DISTINCT label FROM file_labels ORDER BY label")]
+
+    def label_counts(self, file_paths=None):
+        # label -> (files containing it, shapes with it), over the given files or the whole index
+        if file_paths is None:
+            with self._lock:
+                cursor = self._connection.execute(
+                    "SELECT label, COUNT(*), SUM(shape_count) FROM file_labels GROUP BY label ORDER BY label"
+                )
+                return {label: (files, shapes) for label, files, shapes in cursor}
+
+        files, shapes = Counter(), Counter()
+        for batch in _batches(file_paths):
+            keys = list({_key(file_path) for file_path in batch})
+            placeholders = ",".join("?" * len(keys))
+            with self._lock:
+                cursor = self._connection.execute(
+                    f"SELECT label, COUNT(*), SUM(shape_count) FROM file_labels WHERE path IN ({placeholders}) "
+                    "GROUP BY label",
+                    keys,
+                )
+                for label, file_count, shape_count in cursor:
+                    files[label] += file_count
+                    shapes[label] += shape_count
+        return {label: (files[label], shapes[label]) for label in sorted(files)}
+
+    def files_with_labels(self, labels):
+        # Indexed files containing at least one of the labels, sorted by path
+        labels = list(labels)
+        if not labels:
+            return []
+        placeholders = ",".join("?" * len(labels))
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT DISTINCT path FROM file_labels WHERE label IN ({placeholders}) ORDER BY path", labels
+            )
+            return [row[0] for row in cursor]
+
+    def file_labels(self, file_paths):
+        # file_path -> sorted labels for indexed files, like extract_labels' file_label_map
+        file_label_map = {}
+        for batch in _batches(file_paths):
+            keys = {_key(file_path): file_path for file_path in batch}
+            placeholders = ",".join("?" * len(keys))
+            with self._lock:
+                found = self._connection.execute(
+                    f"SELECT path FROM files WHERE path IN ({placeholders})", list(keys)
+                ).fetchall()
+                cursor = self._connection.execute(
+                    f"SELECT path, label FROM file_labels WHERE path IN ({placeholders}) ORDER BY path, label",
+                    list(keys),
+                )
+                rows = cursor.fetchall()
+            for (path,) in found:
+                file_label_map[keys[path]] = []
+            for path, label in rows:
+                file_label_map[keys[path]].append(label)
+        return file_label_map
+
+    def image_size(self, file_path):
+        # (imageWidth, imageHeight) recorded for a file, None if it is not indexed
+        with self._lock:
+            return self._connection.execute(
+                "SELECT image_width, image_height FROM files WHERE path = ?", (_key(file_path),)
+            ).fetchone()
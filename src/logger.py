@@ -1,7 +1,9 @@
 # Logger Setup for Any2YOLO
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
+import queue
 
 # Set up logging
 LOG_FILE = "logs/converter.log"
@@ -27,26 +29,45 @@ formatter = logging.Formatter(
 file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
-# Configure the logger
+
+class _ThreadQueueHandler(QueueHandler):
+    # The queue never leaves this process, so records are passed as-is and
+    # message formatting happens on the listener thread instead of the caller
+    def prepare(self, record):
+        return record
+
+
+# Records are handed off through a queue, a listener thread does the formatting and file/console I/O
+log_queue = queue.SimpleQueue()
+listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+# Configure the logger, converter modules log to its "Any2YOLO.*" children
 logger = logging.getLogger("Any2YOLO")
 logger.setLevel(logging.DEBUG)
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-
-def log_action(message, level="info"):
-
-    # Log based on the level
-    level = level.lower()
-    if level == "info":
-        logger.info(message)
-    elif level == "debug":
-        logger.debug(message)
-    elif level == "warning":
-        logger.warning(message)
-    elif level == "error":
-        logger.error(message)
-    elif level == "critical":
-        logger.critical(message)
-    else:
-        logger.info(message)  # Default to info if level is invalid
+logger.addHandler(_ThreadQueueHandler(log_queue))
+logger.propagate = False
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+
+def set_quiet(quiet=True):
+    # Quiet mode only keeps warnings and errors, for bulk runs
+    logger.setLevel(logging.WARNING if quiet else logging.DEBUG)
+
+
+# ANY2YOLO_QUIET=1 starts the application in quiet mode
+set_quiet(os.environ.get("ANY2YOLO_QUIET", "") not in ("", "0"))
+
+
+def log_action(message, level="info", *args):
+
+    # Log based on the level, "%s" placeholders in message are only filled in if the record is emitted
+    logger.log(LEVELS.get(level.lower(), logging.INFO), message, *args)  # Default to info if level is invalid
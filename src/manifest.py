@@ -0,0 +1,122 @@
+# Conversion manifest for incremental runs
+
+# Records, per input JSON, what the last conversion saw and wrote:
+# input content hash, mtime, size, the ordered selected labels, the converter's output options
+# (mode, validation, simplification) and the output hash, mtime and size. A file is reconverted only when one
+# of them changed. Files are only hashed again when their mtime or size changed, so up-to-date files only cost two stats
+import os
+import json
+import hashlib
+import logging
+from stat import S_ISREG
+
+logger = logging.getLogger("Any2YOLO.manifest")
+
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    # SHA-256 of a file, read in blocks
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    # Tracks converted files so unchanged ones can be skipped
+
+    def __init__(self, path=None, entries=None):
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        if path and entries is None and os.path.isfile(path):
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('files', {})
+            else:
+                logger.warning("Ignoring manifest %s with unsupported version %s", self.path, data.get('version'))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read manifest %s, starting fresh: %s", self.path, e)
+
+    def save(self):
+        # Write atomically so an interrupted run never leaves a corrupt manifest
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        logger.info("Saved manifest with %s entries to %s", len(self.entries), self.path)
+
+    def subset(self, file_paths):
+        # Entries for a batch of files, sent to worker processes
+        return {path: self.entries[path] for path in file_paths if path in self.entries}
+
+    def update(self, entries):
+        self.entries.update(entries)
+
+    def is_up_to_date(self, file_path, output_file, selected_labels, options=""):
+        # True when the input, the label mapping, the output options and the output all match the last run
+        entry = self.entries.get(file_path)
+        if entry is None or entry['labels'] != list(selected_labels) or entry['output'] != output_file:
+            return False
+        if entry.get('options', "") != options:
+            return False
+        try:
+            output_stat = os.stat(output_file)
+        except OSError:
+            return False
+        if not S_ISREG(output_stat.st_mode):
+            return False
+        if (output_stat.st_mtime_ns, output_stat.st_size) != (entry.get('output_mtime_ns'), entry.get('output_size')):
+            # Rewritten, touched or recorded by an older version: compare content
+            if file_hash(output_file) != entry['output_hash']:
+                return False
+            entry['output_mtime_ns'] = output_stat.st_mtime_ns
+            entry['output_size'] = output_stat.st_size
+
+        stat = os.stat(file_path)
+        if stat.st_mtime_ns == entry['mtime_ns'] and stat.st_size == entry['size']:
+            return True
+
+        # Touched but maybe not modified: fall back to comparing content
+        if file_hash(file_path) != entry['input_hash']:
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        entry['size'] = stat.st_size
+        return True
+
+    def record(self, file_path, output_file, selected_labels, options=""):
+        # Remember a successful conversion
+        stat = os.stat(file_path)
+        output_stat = os.stat(output_file)
+        self.entries[file_path] = {
+            'input_hash': file_hash(file_path),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'labels': list(selected_labels),
+            'options': options,
+            'output': output_file,
+            'output_hash': file_hash(output_file),
+            'output_mtime_ns': output_stat.st_mtime_ns,
+            'output_size': output_stat.st_size,
+        }
+
+    def stale_outputs(self):
+        # Outputs whose input JSON was deleted, entries without an output left are dropped
+        stale = []
+        for file_path, entry in list(self.entries.items()):
+            if os.path.exists(file_path):
+                continue
+            if os.path.exists(entry['output']):
+                stale.append(entry['output'])
+            else:
+                del self.entries[file_path]
+        return stale
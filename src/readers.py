@@ -0,0 +1,266 @@
+# Input format readers
+
+# Every reader turns its format into the annotation summary the converter works on:
+#   {"shapes": [{"label", "points", "shape_type"}], "imageWidth", "imageHeight", "imagePath"}
+# so label selection, validation and the box math are shared by all formats.
+# - anylabeling: AnyLabeling JSON, the default for .json files
+# - labelme: LabelMe JSON, same schema, rectangles are converted too
+# - voc: Pascal VOC XML, the default for .xml files
+# - coco: COCO instances JSON, streamed, one record per image
+# New formats subclass AnnotationReader and are added with @register_reader
+import os
+import sqlite3
+import logging
+import tempfile
+import threading
+from array import array
+from xml.etree import ElementTree
+from annotations import load_annotation
+from geometry import merge_parts
+from jsonreader import iter_members
+
+logger = logging.getLogger("Any2YOLO.readers")
+
+READERS = {}
+# Rows inserted per statement while indexing a COCO file
+COCO_BATCH_SIZE = 10000
+
+
+def register_reader(reader_class):
+    READERS[reader_class.name] = reader_class
+    return reader_class
+
+
+def get_reader(input_format="auto", file_path=None):
+    # Reader for a format name, or for a file's extension with "auto". None if no reader applies
+    if isinstance(input_format, AnnotationReader):
+        return input_format
+    if input_format != "auto":
+        if input_format not in READERS:
+            raise ValueError(f"Unknown input format {input_format}, expected one of {', '.join(READERS)}")
+        return _reader_instance(input_format)
+    extension = os.path.splitext(file_path)[1].lower()
+    for name, reader_class in READERS.items():
+        if extension in reader_class.auto_extensions:
+            return _reader_instance(name)
+    return None
+
+
+_instances = {}
+
+
+def _reader_instance(name):
+    if name not in _instances:
+        _instances[name] = READERS[name]()
+    return _instances[name]
+
+
+def _rectangle(x_min, y_min, x_max, y_max):
+    return [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+
+
+class AnnotationReader:
+    # Base class of input formats
+    name = None
+    extensions = ()  # Files picked up when scanning directories for this format
+    auto_extensions = ()  # Extensions this reader handles when the format is "auto"
+    multi_record = False  # One file holds many images (e.g. COCO), read with records()
+
+    def load(self, file_path, stats=None):
+        # Summary of a single-image file
+        raise NotImplementedError
+
+    def records(self, file_path, stats=None):
+        # (key, summary) for every image of a file. The key is a path ending in .json next to
+        # which the output is written, for multi-image files it does not exist on disk
+        yield file_path, self.load(file_path, stats)
+
+
+@register_reader
+class AnyLabelingReader(AnnotationReader):
+    name = "anylabeling"
+    extensions = (".json",)
+    auto_extensions = (".json",)
+
+    def load(self, file_path, stats=None):
+        return load_annotation(file_path, stats)
+
+
+@register_reader
+class LabelMeReader(AnyLabelingReader):
+    # LabelMe writes the schema AnyLabeling inherited, its rectangles become 4-point polygons
+    name = "labelme"
+    auto_extensions = ()
+
+    def load(self, file_path, stats=None):
+        data = load_annotation(file_path, stats)
+        for shape in data.get('shapes', []):
+            if shape.get('shape_type') == "rectangle" and len(shape.get('points') or ()) == 2:
+                (x1, y1), (x2, y2) = shape['points']
+                shape['points'] = _rectangle(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+                shape['shape_type'] = "polygon"
+        return data
+
+
+@register_reader
+class VOCReader(AnnotationReader):
+    name = "voc"
+    extensions = (".xml",)
+    auto_extensions = (".xml",)
+
+    def load(self, file_path, stats=None):
+        root = ElementTree.parse(file_path).getroot()
+        if root.tag != "annotation":
+            raise ValueError(f"Not a Pascal VOC annotation: {file_path}")
+
+        data = {"shapes": []}
+        size = root.find('size')
+        if size is not None and size.findtext('width') and size.findtext('height'):
+            data['imageWidth'] = float(size.findtext('width'))
+            data['imageHeight'] = float(size.findtext('height'))
+        filename = root.findtext('filename')
+        if filename:
+            # VOCdevkit keeps images in JPEGImages/ next to Annotations/
+            voc_path = os.path.join("..", "JPEGImages", filename)
+            in_devkit = os.path.isfile(os.path.join(os.path.dirname(file_path), voc_path))
+            data['imagePath'] = voc_path if in_devkit else filename
+
+        for obj in root.iter('object'):
+            label = (obj.findtext('name') or "").strip()
+            polygon = obj.find('polygon')
+            if polygon is not None:
+                # CVAT style <polygon><x1/><y1/><x2/>...
+                values = [float(child.text) for child in polygon]
+                points = [list(pair) for pair in zip(values[0::2], values[1::2])]
+            else:
+                box = obj.find('bndbox')
+                if box is None:
+                    continue
+                points = _rectangle(*(float(box.findtext(key)) for key in ('xmin', 'ymin', 'xmax', 'ymax')))
+            data['shapes'].append({"label": label, "points": points, "shape_type": "polygon"})
+        return data
+
+
+# COCO files already indexed in this process: (path, mtime_ns, size) -> temporary directory with the index
+_coco_indexes = {}
+_coco_lock = threading.Lock()
+
+
+@register_reader
+class COCOReader(AnnotationReader):
+    # COCO instances JSON, never loaded whole: a first streaming pass stores images, categories and
+    # annotations in an on-disk SQLite index, then images are emitted with their annotations grouped
+    name = "coco"
+    extensions = (".json",)
+    multi_record = True
+
+    def __init__(self, image_dir=None):
+        self.image_dir = image_dir  # Folder the image file_name entries are relative to, default: the JSON's
+
+    def records(self, file_path, stats=None):
+        connection = sqlite3.connect(self._index(file_path))
+        try:
+            categories = dict(connection.execute("SELECT id, name FROM categories"))
+            image_dir = self.image_dir or os.path.dirname(os.path.abspath(file_path))
+            output_dir = os.path.splitext(file_path)[0]
+            images = connection.execute("SELECT id, file_name, width, height FROM images ORDER BY rowid")
+            for image_id, file_name, width, height in images:
+                shapes = []
+                for category_id, packed in connection.execute(
+                    "SELECT category_id, points FROM annotations WHERE image_id = ?", (image_id,)
+                ):
+                    coordinates = array('d')
+                    coordinates.frombytes(packed)
+                    shapes.append({
+                        "label": categories.get(category_id, str(category_id)),
+                        "points": [[x, y] for x, y in zip(coordinates[0::2], coordinates[1::2])],
+                        "shape_type": "polygon",
+                    })
+                data = {
+                    "shapes": shapes,
+                    "imageWidth": width,
+                    "imageHeight": height,
+                    "imagePath": os.path.abspath(os.path.join(image_dir, file_name)),
+                }
+                yield os.path.join(output_dir, os.path.splitext(file_name)[0] + ".json"), data
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _coordinates(segmentation, bbox):
+        # Flat x, y coordinates of an object. Polygon parts are merged into one outline (see merge_parts), a
+        # valid segmentation mask that also gives the box and hull of all parts; RLE masks use the bbox
+        if isinstance(segmentation, list):
+            parts = [part[:len(part) - len(part) % 2] for part in segmentation if isinstance(part, list)]
+            if len(parts) == 1 and parts[0]:
+                return parts[0]
+            coordinates = merge_parts(parts).ravel().tolist()
+            if coordinates:
+                return coordinates
+        if bbox and len(bbox) == 4:
+            x, y, w, h = bbox
+            return [x, y, x + w, y, x + w, y + h, x, y + h]
+        return None
+
+    def _index(self, file_path):
+        # Path of the SQLite index of a COCO file, built on first use
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        with _coco_lock:
+            if key not in _coco_indexes:
+                directory = tempfile.TemporaryDirectory(prefix="any2yolo-coco-")
+                self._build_index(file_path, os.path.join(directory.name, "index.sqlite"))
+                _coco_indexes[key] = directory
+            return os.path.join(_coco_indexes[key].name, "index.sqlite")
+
+    @classmethod
+    def _build_index(cls, file_path, index_path):
+        logger.info("Indexing COCO file %s", file_path)
+        connection = sqlite3.connect(index_path)
+        connection.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE images (id PRIMARY KEY, file_name TEXT, width REAL, height REAL);
+            CREATE TABLE categories (id PRIMARY KEY, name TEXT);
+            CREATE TABLE annotations (image_id, category_id, points BLOB);
+        """)
+        batches = {"images": [], "categories": [], "annotations": []}
+        statements = {
+            "images": "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+            "categories": "INSERT OR REPLACE INTO categories VALUES (?, ?)",
+            "annotations": "INSERT INTO annotations VALUES (?, ?, ?)",
+        }
+        counts = dict.fromkeys(batches, 0)
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for key, item in iter_members(f):
+                if key == "images":
+                    row = (item['id'], item['file_name'], item.get('width'), item.get('height'))
+                elif key == "categories":
+                    row = (item['id'], item['name'])
+                elif key == "annotations":
+                    if item.get('iscrowd'):
+                        continue  # Crowd regions are not single objects
+                    coordinates = cls._coordinates(item.get('segmentation'), item.get('bbox'))
+                    if not coordinates:
+                        continue
+                    # Packed doubles, much cheaper to store and read back than JSON
+                    row = (item['image_id'], item['category_id'], array('d', coordinates).tobytes())
+                else:
+                    continue
+                batches[key].append(row)
+                counts[key] += 1
+                if len(batches[key]) >= COCO_BATCH_SIZE:
+                    connection.executemany(statements[key], batches[key])
+                    batches[key].clear()
+
+        for key, rows in batches.items():
+            connection.executemany(statements[key], rows)
+        # Built after the bulk insert, much faster than maintaining it row by row
+        connection.execute("CREATE INDEX annotations_image ON annotations(image_id)")
+        connection.commit()
+        connection.close()
+        logger.info(
+            "Indexed %s images, %s annotations and %s categories", counts["images"], counts["annotations"],
+            counts["categories"]
+        )
@@ -0,0 +1,146 @@
+# Deterministic sharding of a conversion across machines
+
+# Every node runs the same command with its own shard index:
+#   python src/cli.py /data/annotations --labels dog cat --shard 0/4 --shard-dir /data/shards
+#   python src/cli.py /data/annotations --labels dog cat --shard 1/4 --shard-dir /data/shards
+#   ...
+# A file belongs to the shard picked by a hash of its path, so nodes agree on the split
+# without talking to each other. Each node writes a shard result file, and
+#   python src/cli.py --merge-shards /data/shards [/data/annotations]
+# combines them into one run report and checks that every file was converted exactly once
+import os
+import glob
+import json
+import hashlib
+import logging
+from instrumentation import RunStats
+
+logger = logging.getLogger("Any2YOLO.sharding")
+
+SHARD_VERSION = 1
+
+
+def parse_shard(value):
+    # "3/8" -> (3, 8)
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value}, expected INDEX/COUNT like 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value}, the index must be between 0 and {count - 1}")
+    return index, count
+
+
+def shard_key(file_path):
+    # Path as hashed, independent of the platform's separator
+    return os.path.normpath(file_path).replace(os.sep, "/")
+
+
+def shard_of(file_path, shard_count):
+    # Stable shard of a file, the same on every machine and Python run
+    digest = hashlib.sha1(shard_key(file_path).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def select_shard(file_paths, shard_index, shard_count):
+    # Stream the files of one shard
+    for file_path in file_paths:
+        if shard_of(file_path, shard_count) == shard_index:
+            yield file_path
+
+
+def shard_file_name(shard_index, shard_count):
+    return f"shard-{shard_index:04d}-of-{shard_count:04d}.json"
+
+
+def write_shard_result(directory, shard_index, shard_count, selected_labels, results, stats):
+    # Record what one shard converted, for merge_shards
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, shard_file_name(shard_index, shard_count))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'version': SHARD_VERSION,
+            'shard_index': shard_index,
+            'shard_count': shard_count,
+            'labels': list(selected_labels),
+            'files': results,
+            'stats': stats.to_dict(),
+        }, f)
+    os.replace(tmp_path, path)
+    logger.info("Wrote shard result %s with %s files", path, len(results))
+    return path
+
+
+def _load_shards(directory):
+    shards = []
+    for path in sorted(glob.glob(os.path.join(directory, "shard-*-of-*.json"))):
+        with open(path, 'r') as f:
+            shard = json.load(f)
+        if shard.get('version') != SHARD_VERSION:
+            raise ValueError(f"Shard result {path} has unsupported version {shard.get('version')}")
+        shard['path'] = path
+        shards.append(shard)
+    if not shards:
+        raise ValueError(f"No shard results found in {directory}")
+    return shards
+
+
+def merge_shards(directory, expected_files=None):
+    # Combine the shard results of a directory into one report.
+    # expected_files (e.g. a fresh scan of the sources) also reports files no shard converted
+    shards = _load_shards(directory)
+    shard_count = shards[0]['shard_count']
+    labels = shards[0]['labels']
+    problems = []
+    for shard in shards:
+        if shard['shard_count'] != shard_count:
+            problems.append(f"{shard['path']} was run with {shard['shard_count']} shards instead of {shard_count}")
+        if shard['labels'] != labels:
+            problems.append(f"{shard['path']} was run with labels {shard['labels']} instead of {labels}")
+
+    seen_shards = {shard['shard_index'] for shard in shards}
+    missing_shards = [index for index in range(shard_count) if index not in seen_shards]
+
+    stats = RunStats()
+    results, duplicates, misplaced = {}, [], []
+    for shard in shards:
+        stats.merge(shard['stats'])
+        # Nodes run in parallel, so the run took as long as the slowest shard
+        stats.convert_seconds = max(stats.convert_seconds, shard['stats']['convert_seconds'])
+        stats.extract_seconds = max(stats.extract_seconds, shard['stats']['extract_seconds'])
+        for file_path, result in shard['files'].items():
+            if file_path in results:
+                duplicates.append(file_path)
+            if shard_of(file_path, shard['shard_count']) != shard['shard_index']:
+                misplaced.append(file_path)
+            results[file_path] = result
+
+    missing_files = []
+    if expected_files is not None:
+        missing_files = [file_path for file_path in expected_files if file_path not in results]
+
+    errors = {file_path: result for file_path, result in results.items() if result.startswith("Error")}
+    up_to_date = sum(1 for result in results.values() if result.startswith("Up to date"))
+    report = {
+        'shard_count': shard_count,
+        'shards_found': len(shards),
+        'labels': labels,
+        'files': len(results),
+        'converted': len(results) - len(errors) - up_to_date,
+        'up_to_date': up_to_date,
+        'failed': len(errors),
+        'errors': errors,
+        'missing_shards': missing_shards,
+        'missing_files': missing_files,
+        'duplicate_files': duplicates,
+        'misplaced_files': misplaced,
+        'problems': problems,
+        'complete': not (missing_shards or missing_files or duplicates or misplaced or problems),
+        'stats': stats.report(),
+    }
+    for index in missing_shards:
+        logger.warning("No result for shard %s of %s", index, shard_count)
+    if missing_files:
+        logger.warning("%s files were not converted by any shard", len(missing_files))
+    return report
@@ -0,0 +1,210 @@
+# Tiled YOLO dataset export for very large images
+
+# Images of 8k-20k px are cut into tile_size tiles overlapping by `overlap` pixels, the last row and
+# column aligned with the image border. Every polygon goes to the tiles its box touches, found by a binary
+# search on the tile origins (grid bucketing, never all polygon/tile pairs), is clipped to each of them
+# and kept where enough of it remains:
+#   <output_dir>/labels/<split>/<name>_<x>_<y>.txt     labels of the tile at (x, y), in tile coordinates
+#   <output_dir>/images/<split>/<name>_<x>_<y>.<ext>   the tile's crop, with crop_images (needs Pillow,
+#                                                      only imported then so the CLI stays Pillow free)
+# All tiles of an image go to the same split, so overlapping crops never leak between train and val
+import os
+import logging
+import numpy as np
+from export import DatasetExporter
+from geometry import (
+    pack_polygons, validate_polygons, gather_polygons, clip_polygons_to_boxes, polygon_areas, polygon_offsets,
+)
+
+logger = logging.getLogger("Any2YOLO.tiling")
+
+DEFAULT_TILE_SIZE = 640
+DEFAULT_OVERLAP = 128
+# Part of an object's area a tile must hold for the object to be labeled there, smaller pieces are slivers
+DEFAULT_MIN_AREA_RATIO = 0.2
+
+
+def tile_starts(length, tile_size, overlap):
+    # Tile origins along one axis, the last tile ends on the image border
+    if length <= tile_size:
+        return np.zeros(1, dtype=np.intp)
+    starts = np.arange(0, length - tile_size, tile_size - overlap, dtype=np.intp)
+    return np.append(starts, length - tile_size)
+
+
+def assign_tiles(boxes, x_starts, y_starts, tile_width, tile_height):
+    # (polygon index, tile index) for every (x_min, y_min, x_max, y_max) box and tile it overlaps,
+    # tiles numbered row by row. Each box only looks up the range of tiles it spans in the sorted origins
+    first_x = np.searchsorted(x_starts, boxes[:, 0] - tile_width, side='right')
+    last_x = np.searchsorted(x_starts, boxes[:, 2], side='left')
+    first_y = np.searchsorted(y_starts, boxes[:, 1] - tile_height, side='right')
+    last_y = np.searchsorted(y_starts, boxes[:, 3], side='left')
+    columns = np.maximum(last_x - first_x, 0)
+    counts = columns * np.maximum(last_y - first_y, 0)
+
+    polygon_ids = np.repeat(np.arange(len(boxes)), counts)
+    position = np.arange(len(polygon_ids)) - np.repeat(polygon_offsets(counts)[:-1], counts)
+    tile_x = first_x[polygon_ids] + position % columns[polygon_ids]
+    tile_y = first_y[polygon_ids] + position // columns[polygon_ids]
+    return polygon_ids, tile_y * len(x_starts) + tile_x
+
+
+class TilingExporter(DatasetExporter):
+    # Converts annotations of large images into a YOLO dataset of fixed size tiles
+
+    def __init__(
+        self, input_files, selected_labels, output_dir, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+        min_area_ratio=DEFAULT_MIN_AREA_RATIO, crop_images=False, keep_empty=False, **kwargs
+    ):
+        super().__init__(input_files, selected_labels, output_dir, **kwargs)
+        if tile_size <= 0 or not 0 <= overlap < tile_size:
+            raise ValueError(f"Invalid tile size {tile_size} with overlap {overlap}")
+        self._image_module = None
+        if crop_images:
+            try:
+                from PIL import Image
+            except ImportError:
+                raise ValueError("Cropping tiles needs Pillow (pip install Pillow)")
+            self._image_module = Image
+        if self.manifest is not None or self.dedup is not None:
+            # Both track one output per input, an image here has many
+            raise ValueError("Tiling does not support manifests or deduplication")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.min_area_ratio = min_area_ratio
+        self.crop_images = crop_images
+        self.keep_empty = keep_empty  # Also write tiles without objects, as background samples
+
+    def _worker_options(self):
+        options = super()._worker_options()
+        options.update(
+            tile_size=self.tile_size, overlap=self.overlap, min_area_ratio=self.min_area_ratio,
+            crop_images=self.crop_images, keep_empty=self.keep_empty,
+        )
+        return options
+
+    def iter_results(self, progress=None, cancel=None):
+        if not self.crop_images:
+            # data.yaml still lists images/<split>, Ultralytics needs the tile crops there to train
+            logger.warning(
+                "Tile images are not cropped, %s/images/<split> stays empty until the crops are added",
+                self.output_dir,
+            )
+        yield from super().iter_results(progress, cancel)
+
+    def _source_name(self, output_stem):
+        # Tiles are named <name>_<x>_<y>
+        parts = output_stem.rsplit("_", 2)
+        if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+            return parts[0]
+        return output_stem
+
+    def _prepare_output(self, file_path, data):
+        # Assign the objects of an image to its tiles, the returned function writes their labels (and crops)
+        image_width, image_height = (int(size) for size in self._image_size(file_path, data))
+        x_starts = tile_starts(image_width, self.tile_size, self.overlap)
+        y_starts = tile_starts(image_height, self.tile_size, self.overlap)
+        tile_width, tile_height = min(self.tile_size, image_width), min(self.tile_size, image_height)
+        with self._timer("compute"):
+            tile_labels = self._tile_labels(
+                file_path, data, image_width, image_height, x_starts, y_starts, tile_width, tile_height
+            )
+        if self.stats is not None:
+            self.stats.shapes += sum(shape_count for _, shape_count in tile_labels.values())
+        tiles = range(len(x_starts) * len(y_starts)) if self.keep_empty else sorted(tile_labels)
+        origins = [(int(x_starts[tile % len(x_starts)]), int(y_starts[tile // len(x_starts)])) for tile in tiles]
+        base = os.path.splitext(self._output_path(file_path))[0]
+
+        def write():
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            with self._timer("write"):
+                for tile, (x, y) in zip(tiles, origins):
+                    with open(f"{base}_{x}_{y}.txt", 'w') as out_file:
+                        out_file.write(tile_labels.get(tile, ("", 0))[0])
+                if self.crop_images and origins:
+                    self._crop_tiles(file_path, data, origins, tile_width, tile_height)
+            logger.info("Cut %s into %s labeled tiles", file_path, len(tile_labels))
+            return f"Converted to {len(tiles)} tiles in {os.path.dirname(base)}"
+        return write
+
+    def _tile_labels(self, file_path, data, image_width, image_height, x_starts, y_starts, tile_width, tile_height):
+        # {tile index: (YOLO text, shape count)} of the tiles holding at least one object
+        polygons, classes, shape_indices = self._select_polygons(data)
+        if not polygons:
+            return {}
+        points, offsets = pack_polygons(polygons)
+        classes = np.array(classes)
+        if self.validate:
+            # Broken polygons are dropped for the whole image, too small pieces per tile below
+            points, keep, issue_masks = validate_polygons(points, offsets, image_width, image_height)
+            self._add_issues(file_path, data, shape_indices, self._collect_issues(keep, issue_masks))
+            if not keep.all():
+                points, offsets = gather_polygons(points, offsets, np.flatnonzero(keep))
+                classes = classes[keep]
+            if not len(classes):
+                return {}
+
+        starts = offsets[:-1]
+        boxes = np.column_stack((
+            np.minimum.reduceat(points[:, 0], starts), np.minimum.reduceat(points[:, 1], starts),
+            np.maximum.reduceat(points[:, 0], starts), np.maximum.reduceat(points[:, 1], starts),
+        ))
+        polygon_ids, tile_ids = assign_tiles(boxes, x_starts, y_starts, tile_width, tile_height)
+        tile_origins = np.column_stack((x_starts[tile_ids % len(x_starts)], y_starts[tile_ids // len(x_starts)]))
+        tile_boxes = np.hstack((tile_origins, tile_origins + [tile_width, tile_height])).astype(np.float64)
+        pieces, piece_offsets = clip_polygons_to_boxes(*gather_polygons(points, offsets, polygon_ids), tile_boxes)
+
+        # Slivers: pieces with a small part of their object's area, or a box under min_box_size
+        areas = polygon_areas(pieces, piece_offsets)
+        kept = (np.diff(piece_offsets) >= 3) & (areas > 0)
+        kept &= areas >= self.min_area_ratio * polygon_areas(points, offsets)[polygon_ids]
+        if self.min_box_size > 0 and kept.any():
+            candidates = np.flatnonzero(kept)
+            candidate_points, candidate_offsets = gather_polygons(pieces, piece_offsets, candidates)
+            piece_starts = candidate_offsets[:-1]
+            width = (np.maximum.reduceat(candidate_points[:, 0], piece_starts)
+                     - np.minimum.reduceat(candidate_points[:, 0], piece_starts))
+            height = (np.maximum.reduceat(candidate_points[:, 1], piece_starts)
+                      - np.minimum.reduceat(candidate_points[:, 1], piece_starts))
+            kept[candidates] = (width >= self.min_box_size) & (height >= self.min_box_size)
+
+        # Kept pieces grouped by tile and moved into tile coordinates
+        order = np.flatnonzero(kept)
+        order = order[np.argsort(tile_ids[order], kind='stable')]
+        pieces, piece_offsets = gather_polygons(pieces, piece_offsets, order)
+        pieces = pieces - np.repeat(tile_origins[order], np.diff(piece_offsets), axis=0)
+        piece_classes = classes[polygon_ids[order]].tolist()
+        tiles, group_starts = np.unique(tile_ids[order], return_index=True)
+
+        tile_labels = {}
+        bounds = np.append(group_starts, len(order)).tolist()
+        for tile, first, last in zip(tiles.tolist(), bounds[:-1], bounds[1:]):
+            tile_points = pieces[piece_offsets[first]:piece_offsets[last]]
+            tile_offsets = piece_offsets[first:last + 1] - piece_offsets[first]
+            text = self._format_lines(tile_points, tile_offsets, piece_classes[first:last], tile_width, tile_height)
+            tile_labels[tile] = (text, last - first)
+        logger.debug("Assigned %s polygons to %s tiles of %s", len(classes), len(tile_labels), file_path)
+        return tile_labels
+
+    def _crop_tiles(self, file_path, data, origins, tile_width, tile_height):
+        # Save the crop of every written tile, the image is decoded once
+        image_path = self._find_image(file_path, data)
+        name = self._relative_name(file_path)
+        base = os.path.join(self.output_dir, "images", self.split_for(file_path), *name.split("/"))
+        extension = os.path.splitext(image_path)[1].lower()
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        save_options = {"quality": 95} if extension in (".jpg", ".jpeg") else {}
+
+        # Pillow refuses images of this size by default, as a guard against decompression bombs
+        Image = self._image_module
+        pixel_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(image_path) as image:
+                image.load()
+                for x, y in origins:
+                    crop = image.crop((x, y, x + tile_width, y + tile_height))
+                    crop.save(f"{base}_{x}_{y}{extension}", **save_options)
+        finally:
+            Image.MAX_IMAGE_PIXELS = pixel_limit
+        logger.debug("Saved %s tile crops of %s", len(origins), image_path)